@@ -1,6 +1,6 @@
 """Application configuration management."""
 
-from functools import lru_cache
+from functools import cached_property
 from typing import Optional
 
 from dotenv import load_dotenv
@@ -20,6 +20,8 @@ class Settings(BaseSettings):
     admin_name: str = Field(alias="ADMIN_NAME")
     admin_chat_id: Optional[int] = Field(default=None, alias="ADMIN_CHAT_ID")
     planfix_template_id: int = Field(default=413, alias="PLANFIX_TEMPLATE_ID")
+    # Max (and keep-alive) HTTP connections to the Planfix API
+    planfix_pool_size: int = Field(default=20, ge=1, alias="PLANFIX_POOL_SIZE")
 
     # Webhook authentication
     planfix_webhook_login: Optional[str] = Field(default=None, alias="PLANFIX_WEBHOOK_LOGIN")
@@ -58,6 +60,14 @@ class Settings(BaseSettings):
     webhook_host: str = Field(default="0.0.0.0", alias="WEBHOOK_HOST")
     webhook_port: int = Field(default=8001, alias="WEBHOOK_PORT")
     webhook_base_url: str = Field(default="http://crmbot.restme.pro", alias="WEBHOOK_BASE_URL")
+    # Deliver Telegram updates to the webhook server instead of long polling
+    telegram_webhook: bool = Field(default=False, alias="TELEGRAM_WEBHOOK")
+    telegram_webhook_secret: Optional[str] = Field(default=None, alias="TELEGRAM_WEBHOOK_SECRET")
+
+    # Executor assignment retry job: on/off, tasks checked in parallel / per cycle
+    retry_enabled: bool = Field(default=True, alias="RETRY_ENABLED")
+    retry_concurrency: int = Field(default=5, ge=1, alias="RETRY_CONCURRENCY")
+    retry_batch_size: int = Field(default=5, ge=1, alias="RETRY_BATCH_SIZE")
 
     # Database
     database_path: str = Field(default="bot.db", alias="DATABASE_PATH")
@@ -71,14 +81,19 @@ class Settings(BaseSettings):
         "extra": "ignore",
     }
 
-    @property
+    @cached_property
+    def planfix_base_url_str(self) -> str:
+        """Planfix base URL as a string with exactly one trailing slash."""
+        return str(self.planfix_base_url).rstrip("/") + "/"
+
+    @cached_property
     def task_template_ids_list(self) -> list[int]:
         """Parse task template IDs from comma-separated string."""
         if not self.planfix_task_template_ids:
             return []
         return [int(x.strip()) for x in self.planfix_task_template_ids.split(",") if x.strip()]
 
-    @property
+    @cached_property
     def form_urls_dict(self) -> dict[str, str]:
         """Parse form URLs from comma-separated string."""
         if not self.form_urls:
@@ -101,9 +116,15 @@ class Settings(BaseSettings):
         return base_dict
 
 
-@lru_cache
+# Global settings instance
+_settings: Optional[Settings] = None
+
+
 def get_settings() -> Settings:
     """Return cached settings instance."""
 
-    return Settings()
+    global _settings
+    if _settings is None:
+        _settings = Settings()
+    return _settings
 
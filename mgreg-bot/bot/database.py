@@ -2,7 +2,10 @@
 
 from __future__ import annotations
 
+import asyncio
 import sqlite3
+import time
+from collections import OrderedDict
 from contextlib import asynccontextmanager
 from datetime import datetime
 from pathlib import Path
@@ -11,15 +14,62 @@ from typing import Any, AsyncGenerator, Optional
 import aiosqlite
 
 
+# Columns added to the tasks table after its initial release
+_TASKS_MIGRATIONS = (
+    ("nomber", "nomber TEXT"),
+    ("assignment_chat_id", "assignment_chat_id INTEGER"),
+    ("assignment_message_id", "assignment_message_id INTEGER"),
+    ("form_type", "form_type TEXT"),
+    # Set once the assigned guest is confirmed as executor in Planfix; the retry job skips these
+    ("executor_confirmed_at", "executor_confirmed_at TEXT"),
+    # Per-task backoff state for the executor assignment retry job
+    ("retry_attempts", "retry_attempts INTEGER NOT NULL DEFAULT 0"),
+    ("next_retry_at", "next_retry_at TEXT"),
+    ("last_attempt_at", "last_attempt_at TEXT"),
+    # Set once the deadline scan has handled the task's current deadline
+    ("deadline_checked_at", "deadline_checked_at TEXT"),
+)
+
+# Task number and form type don't change once stored, so lookups are cached in-process
+TASK_CACHE_SIZE = 4096
+TASK_CACHE_TTL = 3600.0
+
+
+def _task_cache_key(task_id: int | str) -> int | str:
+    """Key the task cache by the integer id, so 123 and "123" share an entry."""
+    try:
+        return int(task_id)
+    except (TypeError, ValueError):
+        return task_id
+
+
 class Database:
     """SQLite database wrapper."""
 
     def __init__(self, db_path: str = "bot.db") -> None:
         self.db_path = db_path
+        # One connection for the process lifetime; aiosqlite runs it on a single
+        # worker thread, so queries are serialized through the lock.
+        self._conn: Optional[aiosqlite.Connection] = None
+        self._lock = asyncio.Lock()
+        self._task_cache: OrderedDict[int | str, tuple[float, str, Optional[str]]] = OrderedDict()
+        self._initialized = False
+
+    async def _connect(self) -> aiosqlite.Connection:
+        """Open the shared connection if it is not open yet."""
+        if self._conn is None:
+            conn = await aiosqlite.connect(self.db_path)
+            conn.row_factory = aiosqlite.Row
+            await conn.execute("PRAGMA journal_mode=WAL")
+            await conn.execute("PRAGMA synchronous=NORMAL")
+            self._conn = conn
+        return self._conn
 
     async def init(self) -> None:
-        """Initialize database schema."""
-        async with aiosqlite.connect(self.db_path) as db:
+        """Initialize database schema (once per instance; later calls are no-ops)."""
+        async with self.connection() as db:
+            if self._initialized:
+                return
             # Tasks table
             await db.execute("""
                 CREATE TABLE IF NOT EXISTS tasks (
@@ -35,17 +85,19 @@ class Database:
                 )
             """)
             
-            # Add nomber column if it doesn't exist (migration for existing databases)
-            try:
-                await db.execute("ALTER TABLE tasks ADD COLUMN nomber TEXT")
-            except Exception:
-                pass
-            # Add assignment message columns for "Начать прохождение" message (to delete after form submit)
-            for col in ("assignment_chat_id", "assignment_message_id"):
-                try:
-                    await db.execute(f"ALTER TABLE tasks ADD COLUMN {col} INTEGER")
-                except Exception:
-                    pass
+            # Add columns missing from existing databases (migration). The assignment
+            # columns store the "Начать прохождение" message to delete after form submit.
+            async with db.execute("PRAGMA table_info(tasks)") as cursor:
+                columns = {row[1] for row in await cursor.fetchall()}
+            for name, ddl in _TASKS_MIGRATIONS:
+                if name not in columns:
+                    await db.execute(f"ALTER TABLE tasks ADD COLUMN {ddl}")
+            if "deadline_checked_at" not in columns:
+                # Deadlines that passed before the scan existed were already handled by
+                # the old per-task jobs (or lost with them); don't cancel those tasks now
+                await db.execute(
+                    "UPDATE tasks SET deadline_checked_at = CURRENT_TIMESTAMP WHERE date(deadline) < date('now')"
+                )
 
             # Invitations table
             await db.execute("""
@@ -93,18 +145,53 @@ class Database:
 
             # Indexes
             await db.execute("CREATE INDEX IF NOT EXISTS idx_invitations_task_id ON invitations(task_id)")
+            await db.execute(
+                "CREATE INDEX IF NOT EXISTS idx_invitations_task_open ON invitations(task_id, withdrawn_at)"
+            )
             await db.execute("CREATE INDEX IF NOT EXISTS idx_invitations_guest_id ON invitations(guest_planfix_id)")
             await db.execute("CREATE INDEX IF NOT EXISTS idx_form_sessions_task_id ON form_sessions(task_id)")
             await db.execute("CREATE INDEX IF NOT EXISTS idx_form_sessions_completed ON form_sessions(completed_at)")
+            await db.execute("DROP INDEX IF EXISTS idx_tasks_retry")
+            await db.execute(
+                """
+                CREATE INDEX IF NOT EXISTS idx_tasks_retry_due ON tasks(next_retry_at, task_id)
+                WHERE assigned_guest_id IS NOT NULL AND executor_confirmed_at IS NULL
+                """
+            )
+            await db.execute("DROP INDEX IF EXISTS idx_tasks_deadline_due")
+            await db.execute(
+                """
+                CREATE INDEX IF NOT EXISTS idx_tasks_deadline_day_due ON tasks(date(deadline))
+                WHERE deadline_checked_at IS NULL
+                """
+            )
 
             await db.commit()
+            self._initialized = True
 
     @asynccontextmanager
     async def connection(self) -> AsyncGenerator[aiosqlite.Connection, None]:
-        """Get database connection."""
-        async with aiosqlite.connect(self.db_path) as conn:
-            conn.row_factory = aiosqlite.Row
-            yield conn
+        """Get the shared database connection."""
+        async with self._lock:
+            yield await self._connect()
+
+    @asynccontextmanager
+    async def transaction(self) -> AsyncGenerator[aiosqlite.Connection, None]:
+        """Run several statements on the shared connection under one commit."""
+        async with self.connection() as conn:
+            try:
+                yield conn
+            except BaseException:
+                await conn.rollback()
+                raise
+            await conn.commit()
+
+    async def close(self) -> None:
+        """Close the shared connection."""
+        async with self._lock:
+            if self._conn is not None:
+                await self._conn.close()
+                self._conn = None
 
     async def execute(self, query: str, params: tuple = ()) -> aiosqlite.Cursor:
         """Execute query."""
@@ -125,6 +212,34 @@ class Database:
             async with conn.execute(query, params) as cursor:
                 return await cursor.fetchall()
 
+    async def get_task_refs(self, task_id: int | str) -> tuple[Optional[str], Optional[str]]:
+        """Return (nomber, form_type) stored for task_id; either may be None."""
+        key = _task_cache_key(task_id)
+        cached = self._task_cache.get(key)
+        if cached is not None and time.monotonic() - cached[0] < TASK_CACHE_TTL:
+            self._task_cache.move_to_end(key)
+            return cached[1], cached[2]
+
+        row = await self.fetch_one("SELECT nomber, form_type FROM tasks WHERE task_id = ?", (task_id,))
+        if not row or not row["nomber"]:
+            # Not cached: the webhook may store the number later
+            return None, row["form_type"] if row else None
+        nomber = str(row["nomber"])
+        self._task_cache[key] = (time.monotonic(), nomber, row["form_type"])
+        self._task_cache.move_to_end(key)
+        if len(self._task_cache) > TASK_CACHE_SIZE:
+            self._task_cache.popitem(last=False)
+        return nomber, row["form_type"]
+
+    async def get_task_nomber(self, task_id: int | str) -> Optional[str]:
+        """Return the Planfix task number (nomber) stored for task_id, if any."""
+        nomber, _ = await self.get_task_refs(task_id)
+        return nomber
+
+    def forget_task(self, task_id: int | str) -> None:
+        """Drop cached task refs after the tasks row is rewritten."""
+        self._task_cache.pop(_task_cache_key(task_id), None)
+
 
 # Global database instance
 _db: Optional[Database] = None
@@ -1,7 +1,7 @@
 """Handlers package."""
 
 from .invitations import router as invitations_router
-from .registration import router as registration_router
+from .registration import admin_notification_worker, router as registration_router
 
-__all__ = ["registration_router", "invitations_router"]
+__all__ = ["registration_router", "invitations_router", "admin_notification_worker"]
 
@@ -3,47 +3,81 @@
 from __future__ import annotations
 
 import asyncio
+import time
+from contextlib import asynccontextmanager
 from datetime import datetime
+from typing import AsyncIterator, Iterable
+from urllib.parse import urlencode
 
 from aiogram import F, Router
-from aiogram.types import CallbackQuery
+from aiogram.types import CallbackQuery, InlineKeyboardButton, InlineKeyboardMarkup, WebAppInfo
 
 from bot.database import get_database
 from bot.logging import get_logger
+from bot.schemas import WEBAPP_FORM_DEFAULT, webapp_form_for_task
 from bot.services.planfix import PlanfixClient, PlanfixError
-import hashlib
-import hmac
-
+from bot.services.signing import keyed_hmac
 from bot.config import get_settings
 
 router = Router()
 logger = get_logger(__name__)
 
 
-# Lock for concurrent accept handling
+ACCEPT_PREFIX = "accept|"
+DECLINE_PREFIX = "decline|"
+
+# Parallel Telegram deletions when withdrawing invitations (Telegram allows ~30 msg/s)
+DELETE_CONCURRENCY = 10
+
+# Per-task locks for concurrent accept handling. An entry lives only while some accept
+# holds or waits for it, so the map stays as small as the number of in-flight accepts.
 _accept_locks: dict[int, asyncio.Lock] = {}
+_accept_lock_users: dict[int, int] = {}
 
 
-def get_lock(task_id: int) -> asyncio.Lock:
-    """Get or create lock for task."""
-    if task_id not in _accept_locks:
-        _accept_locks[task_id] = asyncio.Lock()
-    return _accept_locks[task_id]
+@asynccontextmanager
+async def accept_lock(task_id: int) -> AsyncIterator[None]:
+    """Hold the accept lock for a task, dropping its entry once the last user leaves."""
+    lock = _accept_locks.setdefault(task_id, asyncio.Lock())
+    _accept_lock_users[task_id] = _accept_lock_users.get(task_id, 0) + 1
+    try:
+        async with lock:
+            yield
+    finally:
+        _accept_lock_users[task_id] -= 1
+        if not _accept_lock_users[task_id]:
+            del _accept_lock_users[task_id]
+            del _accept_locks[task_id]
+
+
+def build_webapp_keyboard(webapp_url: str) -> InlineKeyboardMarkup:
+    """Keyboard with the "Начать прохождение" WebApp button."""
+    return InlineKeyboardMarkup(
+        inline_keyboard=[[InlineKeyboardButton(text="Начать прохождение", web_app=WebAppInfo(url=webapp_url))]]
+    )
 
 
-@router.callback_query(F.data.startswith("accept|"))
-async def handle_accept(callback: CallbackQuery, bot_data: dict) -> None:
+def _parse_task_id(data: str | None, prefix: str) -> int | None:
+    """Return the task id from "<prefix><task_id>" callback data."""
+    task_id_str = data[len(prefix):] if data and data.startswith(prefix) else ""
+    return int(task_id_str) if task_id_str.isdecimal() else None
+
+
+@router.callback_query(F.data.startswith(ACCEPT_PREFIX))
+async def handle_accept(
+    callback: CallbackQuery,
+    bot_data: dict,
+    planfix_client: PlanfixClient | None = None,
+) -> None:
     """Handle accept invitation callback."""
     await callback.answer()
 
-    try:
-        _, task_id_str = callback.data.split("|", 1)
-        task_id = int(task_id_str)
-    except ValueError:
+    task_id = _parse_task_id(callback.data, ACCEPT_PREFIX)
+    if task_id is None:
         await callback.message.answer("Ошибка: неверный формат данных.")
         return
 
-    client: PlanfixClient | None = bot_data.get("planfix_client")
+    client = planfix_client
     if not client:
         logger.error("planfix_client_not_initialized")
         await callback.message.answer("Произошла внутренняя ошибка. Пожалуйста, попробуй позже.")
@@ -66,51 +100,57 @@ async def handle_accept(callback: CallbackQuery, bot_data: dict) -> None:
     guest_planfix_id = guest_mapping["planfix_contact_id"]
 
     # Get nomber (task number) from database for API calls
-    task_row = await db.fetch_one(
-        "SELECT nomber FROM tasks WHERE task_id = ?",
-        (task_id,),
-    )
-    task_nomber = None
-    if task_row:
-        try:
-            task_nomber = task_row["nomber"]
-            if task_nomber:
-                task_nomber = str(task_nomber)
-        except (KeyError, TypeError):
-            task_nomber = None
-    
+    task_nomber, form_type = await db.get_task_refs(task_id)
     if not task_nomber:
         # Fallback to task_id if nomber is not available (for backward compatibility)
         task_nomber = str(task_id)
         logger.warning("nomber_not_found_using_task_id", task_id=task_id)
 
     # Concurrent lock
-    lock = get_lock(task_id)
-    async with lock:
-        # Check if task already has executor
+    async with accept_lock(task_id):
+        # One timestamp for every withdrawal this accept causes
+        accepted_at = datetime.now().isoformat()
+        # Check if task already has executor. A confirmed executor, or another guest an
+        # earlier accept reserved the task for, is answered locally instead of asking
+        # Planfix once per click. A reservation for this same guest (left by a failed
+        # assignment) goes back to Planfix, so the guest can retry.
+        assigned_row = await db.fetch_one(
+            "SELECT assigned_guest_id, executor_confirmed_at FROM tasks WHERE task_id = ?",
+            (task_id,),
+        )
+        already_assigned = bool(
+            assigned_row
+            and (
+                assigned_row["executor_confirmed_at"] is not None
+                or assigned_row["assigned_guest_id"] not in (None, guest_planfix_id)
+            )
+        )
         # Note: If task is not found in Planfix (e.g., it's deleted or doesn't exist yet),
         # we continue anyway as the task might have been created by automation and not yet available via API
-        task = None
-        try:
-            # Use nomber (task number) for API calls, not task_id
-            task = await client.get_task(task_nomber, fields="id,assignees")
-            assignees = task.get("assignees", {})
-            # Handle both formats: object with "users" field or list
-            if isinstance(assignees, dict):
-                users = assignees.get("users", [])
-            elif isinstance(assignees, list):
-                users = assignees
-            else:
-                users = []
-            if users:
-                # Already assigned
-                await callback.message.answer("Мы уже нашли тайного гостя для этой проверки. Спасибо!")
-                await withdraw_invitations(task_id, callback.message.chat.id, callback.message.message_id, db)
-                return
-        except PlanfixError as e:
-            # Log error but continue - task might not be available via API yet (created by automation)
-            logger.warning("planfix_task_check_failed", task_nomber=task_nomber, task_id=task_id, error=str(e), message="Continuing anyway")
-            # Don't return - allow assignment to proceed
+        if not already_assigned:
+            try:
+                # Use nomber (task number) for API calls, not task_id
+                task = await client.get_task(task_nomber, fields="id,assignees")
+                assignees = task.get("assignees", {})
+                # Handle both formats: object with "users" field or list
+                if isinstance(assignees, dict):
+                    users = assignees.get("users", [])
+                elif isinstance(assignees, list):
+                    users = assignees
+                else:
+                    users = []
+                already_assigned = bool(users)
+            except PlanfixError as e:
+                # Log error but continue - task might not be available via API yet (created by automation)
+                logger.warning("planfix_task_check_failed", task_nomber=task_nomber, task_id=task_id, error=str(e), message="Continuing anyway")
+                # Don't return - allow assignment to proceed
+
+        if already_assigned:
+            await callback.message.answer("Мы уже нашли тайного гостя для этой проверки. Спасибо!")
+            await withdraw_invitations(
+                task_id, callback.message.chat.id, callback.message.message_id, db, withdrawn_at=accepted_at
+            )
+            return
 
         # Prepare custom fields for assignment
         custom_field_data = []
@@ -169,16 +209,31 @@ async def handle_accept(callback: CallbackQuery, bot_data: dict) -> None:
                 )
                 # Update database anyway to mark assignment attempt
                 await db.execute(
-                    "UPDATE tasks SET assigned_guest_id = ? WHERE task_id = ?",
+                    "UPDATE tasks SET assigned_guest_id = ?, executor_confirmed_at = NULL WHERE task_id = ?",
                     (guest_planfix_id, task_id),
                 )
                 return
 
-        # Update database (whether assignment succeeded or task not found)
-        await db.execute(
-            "UPDATE tasks SET assigned_guest_id = ? WHERE task_id = ?",
-            (guest_planfix_id, task_id),
-        )
+        # Update database (whether assignment succeeded or task not found) and
+        # withdraw the other invitations under a single commit
+        async with db.transaction() as conn:
+            # Only a successful Planfix assignment is confirmed; otherwise the retry job picks it up
+            await conn.execute(
+                """
+                UPDATE tasks
+                SET assigned_guest_id = ?,
+                    executor_confirmed_at = CASE WHEN ? THEN CURRENT_TIMESTAMP END
+                WHERE task_id = ?
+                """,
+                (guest_planfix_id, assignment_success, task_id),
+            )
+            withdrawn = await _mark_invitations_withdrawn(
+                conn,
+                task_id,
+                callback.message.chat.id,
+                callback.message.message_id,
+                accepted_at,
+            )
 
         if assignment_success:
             # Remove Accept/Decline buttons from invitation message
@@ -188,23 +243,13 @@ async def handle_accept(callback: CallbackQuery, bot_data: dict) -> None:
                 logger.warning("invitation_buttons_remove_failed", task_id=task_id, error=str(e))
 
             # Send success message with WebApp button (stored for deletion after form submit)
-            webapp_url = await generate_webapp_url(task_id, guest_planfix_id, settings, client=client)
+            webapp_url = await generate_webapp_url(
+                task_id, guest_planfix_id, settings, client=client, form_type=form_type
+            )
             if webapp_url:
-                from aiogram.types import InlineKeyboardButton, InlineKeyboardMarkup, WebAppInfo
-
-                keyboard = InlineKeyboardMarkup(
-                    inline_keyboard=[
-                        [
-                            InlineKeyboardButton(
-                                text="Начать прохождение",
-                                web_app=WebAppInfo(url=webapp_url),
-                            )
-                        ]
-                    ]
-                )
                 msg = await callback.message.answer(
                     "Отлично! Ты закреплён(а) за этой проверкой. Нажми «Начать прохождение», чтобы заполнить анкету.",
-                    reply_markup=keyboard,
+                    reply_markup=build_webapp_keyboard(webapp_url),
                 )
             else:
                 msg = await callback.message.answer(
@@ -241,25 +286,21 @@ async def handle_accept(callback: CallbackQuery, bot_data: dict) -> None:
                 "Свяжемся с тобой для дальнейших инструкций."
             )
 
-        # Withdraw all invitations for this task
-        await withdraw_all_invitations(
-            task_id,
-            callback.message.chat.id,
-            callback.message.message_id,
-            db,
-            bot_instance=callback.bot,
-        )
+        # Delete the withdrawn invitation messages
+        await _delete_invitation_messages(callback.bot, withdrawn)
 
 
-@router.callback_query(F.data.startswith("decline|"))
-async def handle_decline(callback: CallbackQuery, bot_data: dict) -> None:
+@router.callback_query(F.data.startswith(DECLINE_PREFIX))
+async def handle_decline(
+    callback: CallbackQuery,
+    bot_data: dict,
+    planfix_client: PlanfixClient | None = None,
+) -> None:
     """Handle decline invitation callback."""
     await callback.answer()
 
-    try:
-        _, task_id_str = callback.data.split("|", 1)
-        task_id = int(task_id_str)
-    except ValueError:
+    task_id = _parse_task_id(callback.data, DECLINE_PREFIX)
+    if task_id is None:
         await callback.message.answer("Ошибка: неверный формат данных.")
         return
 
@@ -284,16 +325,18 @@ async def handle_decline(callback: CallbackQuery, bot_data: dict) -> None:
         logger.warning("invitation_delete_failed", error=str(e))
 
     # Check if all declined
-    active_invitations = await db.fetch_all(
+    active_row = await db.fetch_one(
         """
-        SELECT COUNT(*) as count FROM invitations 
-        WHERE task_id = ? AND withdrawn_at IS NULL
+        SELECT EXISTS(
+            SELECT 1 FROM invitations 
+            WHERE task_id = ? AND withdrawn_at IS NULL
+        ) AS active
         """,
         (task_id,),
     )
-    if active_invitations and active_invitations[0]["count"] == 0:
+    if not active_row["active"]:
         # Notify admin
-        client: PlanfixClient | None = bot_data.get("planfix_client")
+        client = planfix_client
         admin_chat_id = bot_data.get("admin_chat_id")
         if client and admin_chat_id:
             try:
@@ -303,21 +346,7 @@ async def handle_decline(callback: CallbackQuery, bot_data: dict) -> None:
                     f"⚠️ Все гости отказались от проверки задачи #{task_id}.",
                 )
                 # Get nomber from database for API call
-                task_row = await db.fetch_one(
-                    "SELECT nomber FROM tasks WHERE task_id = ?",
-                    (task_id,),
-                )
-                task_nomber = None
-                if task_row:
-                    try:
-                        task_nomber = task_row["nomber"]
-                        if task_nomber:
-                            task_nomber = str(task_nomber)
-                    except (KeyError, TypeError):
-                        task_nomber = None
-                
-                if not task_nomber:
-                    task_nomber = str(task_id)
+                task_nomber = await db.get_task_nomber(task_id) or str(task_id)
                 await client.add_task_comment(task_nomber, "⚠️ Все приглашённые гости отказались от проверки.")
             except Exception as e:
                 logger.error("admin_notification_failed", error=str(e))
@@ -328,6 +357,7 @@ async def withdraw_invitations(
     current_chat_id: int,
     current_message_id: int,
     db,
+    withdrawn_at: str | None = None,
 ) -> None:
     """Withdraw invitation for current user."""
     await db.execute(
@@ -336,7 +366,7 @@ async def withdraw_invitations(
         SET withdrawn_at = ? 
         WHERE task_id = ? AND chat_id = ? AND message_id = ?
         """,
-        (datetime.now().isoformat(), task_id, current_chat_id, current_message_id),
+        (withdrawn_at or datetime.now().isoformat(), task_id, current_chat_id, current_message_id),
     )
 
 
@@ -346,97 +376,119 @@ async def withdraw_all_invitations(
     exclude_message_id: int,
     db,
     bot_instance=None,
+    withdrawn_at: str | None = None,
 ) -> None:
     """Withdraw all invitations for task except the accepted one."""
-    # Get all invitation messages
-    invitations = await db.fetch_all(
-        """
-        SELECT chat_id, message_id FROM invitations 
-        WHERE task_id = ? AND withdrawn_at IS NULL
-        AND NOT (chat_id = ? AND message_id = ?)
-        """,
-        (task_id, exclude_chat_id, exclude_message_id),
-    )
+    async with db.transaction() as conn:
+        invitations = await _mark_invitations_withdrawn(
+            conn,
+            task_id,
+            exclude_chat_id,
+            exclude_message_id,
+            withdrawn_at or datetime.now().isoformat(),
+        )
 
-    # Mark as withdrawn
-    await db.execute(
+    if bot_instance:
+        await _delete_invitation_messages(bot_instance, invitations)
+
+
+async def _mark_invitations_withdrawn(
+    conn,
+    task_id: int,
+    exclude_chat_id: int,
+    exclude_message_id: int,
+    withdrawn_at: str,
+) -> list:
+    """Mark open invitations withdrawn and return their chat/message ids.
+
+    Runs on a connection from ``Database.transaction`` so it can share a commit
+    with other statements.
+    """
+    async with conn.execute(
         """
         UPDATE invitations 
         SET withdrawn_at = ? 
         WHERE task_id = ? AND withdrawn_at IS NULL
         AND NOT (chat_id = ? AND message_id = ?)
+        RETURNING chat_id, message_id
         """,
-        (datetime.now().isoformat(), task_id, exclude_chat_id, exclude_message_id),
+        (withdrawn_at, task_id, exclude_chat_id, exclude_message_id),
+    ) as cursor:
+        return await cursor.fetchall()
+
+
+async def _delete_invitation_messages(bot_instance, invitations) -> None:
+    """Delete invitation messages concurrently."""
+    if not invitations:
+        return
+    semaphore = asyncio.Semaphore(DELETE_CONCURRENCY)
+    await asyncio.gather(
+        *(
+            _delete_invitation_message(bot_instance, inv["chat_id"], inv["message_id"], semaphore)
+            for inv in invitations
+        )
     )
 
-    # Delete invitation messages
-    if bot_instance:
-        for inv in invitations:
-            try:
-                await bot_instance.delete_message(inv["chat_id"], inv["message_id"])
-            except Exception as e:
-                logger.warning("invitation_message_delete_failed", chat_id=inv["chat_id"], message_id=inv["message_id"], error=str(e))
 
+async def _delete_invitation_message(bot_instance, chat_id: int, message_id: int, semaphore: asyncio.Semaphore) -> None:
+    async with semaphore:
+        try:
+            await bot_instance.delete_message(chat_id, message_id)
+        except Exception as e:
+            logger.warning("invitation_message_delete_failed", chat_id=chat_id, message_id=message_id, error=str(e))
 
-def generate_webapp_signature(params: dict[str, str], secret: str) -> str:
-    """Generate HMAC signature for WebApp URL."""
-    sorted_params = sorted(params.items())
-    query_string = "&".join(f"{k}={v}" for k, v in sorted_params)
-    return hmac.new(
-        secret.encode(),
-        query_string.encode(),
-        hashlib.sha256,
-    ).hexdigest()
 
+def generate_webapp_signature(params: Iterable[tuple[str, str]], secret: str) -> str:
+    """Generate HMAC signature for WebApp URL.
 
-async def generate_webapp_url(task_id: int, guest_id: int, settings, client: PlanfixClient = None) -> str | None:
-    """Generate WebApp URL with signature."""
+    ``params`` must already be sorted by key; the webhook server verifies
+    against the sorted query string.
+    """
+    query_string = "&".join(f"{k}={v}" for k, v in params)
+    mac = keyed_hmac(secret)
+    mac.update(query_string.encode())
+    return mac.hexdigest()
+
+
+async def generate_webapp_url(
+    task_id: int,
+    guest_id: int,
+    settings,
+    client: PlanfixClient = None,
+    form_type: str | None = None,
+) -> str | None:
+    """Generate WebApp URL with signature.
+
+    Pass ``form_type`` when the caller already read it from the tasks row.
+    """
     if not settings or not hasattr(settings, "webhook_base_url"):
         return None
 
     base_url = settings.webhook_base_url or "http://localhost:8001"
     
-    # Determine form type from task (default to resto_a)
-    form = "resto_a"
-    if client:
-        try:
-            # Get nomber from database for API call
-            from bot.database import get_database
-            db = get_database()
-            task_row = await db.fetch_one(
-                "SELECT nomber FROM tasks WHERE task_id = ?",
-                (task_id,),
-            )
-            task_nomber = None
-            if task_row:
-                try:
-                    task_nomber = task_row["nomber"]
-                    if task_nomber:
-                        task_nomber = str(task_nomber)
-                except (KeyError, TypeError):
-                    task_nomber = None
-            
-            if not task_nomber:
-                # Fallback to task_id if nomber is not available
-                task_nomber = str(task_id)
-            
-            # Use nomber (task number) for API call
-            task = await client.get_task(task_nomber, fields="id,name,description,customFieldData")
-            # Check custom fields or task name to determine form type
-            task_name = task.get("name", "").lower()
-            if "доставка" in task_name or "delivery" in task_name:
-                form = "delivery_a"  # Default delivery form
-            # Could also check custom fields for form type
-        except Exception as e:
-            logger.warning("form_type_determination_failed", task_id=task_id, error=str(e))
-
-    params = {
-        "taskId": str(task_id),
-        "guestId": str(guest_id),
-        "form": form,
-        "ts": str(int(datetime.now().timestamp())),
-    }
+    # Form type is stored when the task webhook arrives; default to resto_a
+    form = form_type
+    if form is None:
+        task_nomber, form = await get_database().get_task_refs(task_id)
+        if form is None and client:
+            # Tasks stored before form_type existed, or whose details fetch failed
+            try:
+                # Use nomber (task number) for API call, falling back to task_id
+                task = await client.get_task(task_nomber or str(task_id), fields="id,name")
+                form = webapp_form_for_task(task.get("name"))
+            except Exception as e:
+                logger.warning("form_type_determination_failed", task_id=task_id, error=str(e))
+    form = form or WEBAPP_FORM_DEFAULT
+
+    ts = str(int(time.time()))
+    # Sorted by key, as generate_webapp_signature expects
+    params = (
+        ("form", form),
+        ("guestId", str(guest_id)),
+        ("taskId", str(task_id)),
+        ("ts", ts),
+    )
     sig = generate_webapp_signature(params, settings.webapp_hmac_secret)
 
-    return f"{base_url}/webapp/start?taskId={task_id}&guestId={guest_id}&form={form}&sig={sig}&ts={params['ts']}"
+    return f"{base_url}/webapp/start?{urlencode(params)}&sig={sig}"
 
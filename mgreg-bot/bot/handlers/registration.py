@@ -2,17 +2,21 @@
 
 from __future__ import annotations
 
-from aiogram import F, Router
-from aiogram.filters import CommandStart
+import asyncio
+from typing import Any, Awaitable, Callable, TypeVar
+
+from aiogram import Bot, F, Router
+from aiogram.filters import Command, CommandStart
 from aiogram.fsm.context import FSMContext
 from aiogram.types import (
     CallbackQuery,
+    InlineKeyboardButton,
+    InlineKeyboardMarkup,
     KeyboardButton,
     Message,
     ReplyKeyboardMarkup,
     ReplyKeyboardRemove,
 )
-from aiogram.utils.keyboard import InlineKeyboardBuilder
 
 from bot.logging import get_logger
 from bot.schemas import ContactData
@@ -30,14 +34,27 @@ from bot.states import RegistrationStates
 router = Router()
 logger = get_logger(__name__)
 
+T = TypeVar("T")
+
+# Admin notifications are sent by a background worker so the guest's
+# confirmation doesn't wait on an extra Telegram round-trip
+_admin_notifications: asyncio.Queue[tuple[int, str]] = asyncio.Queue()
+
+# Contact data built in confirm_registration, reused if the guest confirms a duplicate update
+PENDING_CONTACTS_MAX = 1024
+_pending_contacts: dict[int, ContactData] = {}
+
 BUTTON_REGISTER = "Зарегистрироваться как Тайный гость"
 BUTTON_SHARE_CONTACT = "Поделиться контактом"
 
-GENDERS = [
+GENDERS = (
     "Мужской",
     "Женский",
     "Другой/Не хочу указывать!",
-]
+)
+_GENDERS_SET = frozenset(GENDERS)
+GENDER_PREFIX = "g:"
+GENDER_PROMPT = "Выбери, пожалуйста, пол."
 
 
 def contact_keyboard() -> ReplyKeyboardMarkup:
@@ -48,38 +65,79 @@ def contact_keyboard() -> ReplyKeyboardMarkup:
     )
 
 
-def gender_keyboard() -> ReplyKeyboardMarkup:
-    buttons = [[KeyboardButton(text=gender)] for gender in GENDERS]
-    return ReplyKeyboardMarkup(keyboard=buttons, resize_keyboard=True, one_time_keyboard=True)
+def gender_keyboard() -> InlineKeyboardMarkup:
+    # callback_data carries the index into GENDERS
+    buttons = [
+        [InlineKeyboardButton(text=gender, callback_data=f"{GENDER_PREFIX}{index}")]
+        for index, gender in enumerate(GENDERS)
+    ]
+    return InlineKeyboardMarkup(inline_keyboard=buttons)
 
 
-def confirmation_keyboard() -> InlineKeyboardBuilder:
-    builder = InlineKeyboardBuilder()
-    builder.button(text="Подтвердить регистрацию", callback_data="confirm_registration")
-    builder.button(text="Изменить данные", callback_data="change_registration")
-    builder.adjust(1)
-    return builder
+def confirmation_keyboard() -> InlineKeyboardMarkup:
+    return InlineKeyboardMarkup(
+        inline_keyboard=[
+            [InlineKeyboardButton(text="Подтвердить регистрацию", callback_data="confirm_registration")],
+            [InlineKeyboardButton(text="Изменить данные", callback_data="change_registration")],
+        ]
+    )
 
 
-def duplicate_keyboard() -> InlineKeyboardBuilder:
-    builder = InlineKeyboardBuilder()
-    builder.button(text="Обновить данные", callback_data="duplicate_update_yes")
-    builder.button(text="Отмена", callback_data="duplicate_update_no")
-    builder.adjust(1)
-    return builder
+def duplicate_keyboard() -> InlineKeyboardMarkup:
+    return InlineKeyboardMarkup(
+        inline_keyboard=[
+            [InlineKeyboardButton(text="Обновить данные", callback_data="duplicate_update_yes")],
+            [InlineKeyboardButton(text="Отмена", callback_data="duplicate_update_no")],
+        ]
+    )
+
+
+# Keyboards never change, so they are built once at import and shared
+START_KEYBOARD = ReplyKeyboardMarkup(keyboard=[[KeyboardButton(text=BUTTON_REGISTER)]], resize_keyboard=True)
+CONTACT_KEYBOARD = contact_keyboard()
+GENDER_KEYBOARD = gender_keyboard()
+CONFIRMATION_MARKUP = confirmation_keyboard()
+DUPLICATE_MARKUP = duplicate_keyboard()
+REMOVE_KEYBOARD = ReplyKeyboardRemove()
+
+
+SUMMARY_TEMPLATE = (
+    "Проверь, пожалуйста, данные:\n"
+    "Телефон: {phone}\n"
+    "Фамилия: {last_name}\n"
+    "Имя: {first_name}\n"
+    "Отчество: {patronymic}\n"
+    "Пол: {gender}\n"
+    "Дата рождения: {birthdate:%d.%m.%Y}\n"
+    "Город: {city}"
+)
 
 
 def format_summary(data: dict) -> str:
-    return (
-        "Проверь, пожалуйста, данные:\n"
-        f"Телефон: {data['phone']}\n"
-        f"Фамилия: {data['last_name']}\n"
-        f"Имя: {data['first_name']}\n"
-        f"Отчество: {data.get('patronymic') or '—'}\n"
-        f"Пол: {data['gender']}\n"
-        f"Дата рождения: {data['birthdate']}\n"
-        f"Город: {data['city']}"
-    )
+    return SUMMARY_TEMPLATE.format_map({**data, "patronymic": data.get("patronymic") or "—"})
+
+
+async def admin_notification_worker(bot: Bot) -> None:
+    """Send queued admin notifications until cancelled."""
+    while True:
+        chat_id, text = await _admin_notifications.get()
+        try:
+            await bot.send_message(chat_id, text)
+        except Exception as exc:  # pragma: no cover - logging safeguard
+            logger.error("admin_notification_failed", error=str(exc))
+        finally:
+            _admin_notifications.task_done()
+
+
+@router.message.middleware()
+async def stripped_text_middleware(
+    handler: Callable[[Message, dict[str, Any]], Awaitable[Any]],
+    event: Message,
+    data: dict[str, Any],
+) -> Any:
+    """Inject the message text, stripped once, as the ``text`` handler argument."""
+    data["text"] = event.text.strip() if event.text else ""
+    return await handler(event, data)
 
 
 def build_contact_data(state_data: dict) -> ContactData:
@@ -89,7 +147,7 @@ def build_contact_data(state_data: dict) -> ContactData:
         first_name=state_data["first_name"],
         patronymic=state_data.get("patronymic"),
         gender=state_data["gender"],
-        birthdate=state_data["birthdate_obj"],
+        birthdate=state_data["birthdate"],
         city=state_data["city"],
         telegram_username=state_data.get("telegram_username"),
         telegram_id=state_data.get("telegram_id"),
@@ -105,13 +163,11 @@ async def cmd_start(message: Message, state: FSMContext) -> None:
     )
     await message.answer(
         "Привет! Я помогу твоей регистрации как Тайный гость — всё займёт пару минут.",
-        reply_markup=ReplyKeyboardMarkup(
-            keyboard=[[KeyboardButton(text=BUTTON_REGISTER)]],
-            resize_keyboard=True,
-        ),
+        reply_markup=START_KEYBOARD,
     )
 
 
+@router.message(Command("register"))
 @router.message(F.text == BUTTON_REGISTER)
 async def start_registration(message: Message, state: FSMContext) -> None:
     await state.set_state(RegistrationStates.waiting_for_phone)
@@ -122,7 +178,7 @@ async def start_registration(message: Message, state: FSMContext) -> None:
         )
     await message.answer(
         "Поделись номером — нажми кнопку «Поделиться контактом» или введи вручную.",
-        reply_markup=contact_keyboard(),
+        reply_markup=CONTACT_KEYBOARD,
     )
 
 
@@ -142,27 +198,27 @@ async def handle_contact(message: Message, state: FSMContext) -> None:
     await state.set_state(RegistrationStates.waiting_for_last_name)
     await message.answer(
         "Отлично! Теперь напиши, пожалуйста, фамилию.",
-        reply_markup=ReplyKeyboardRemove(),
+        reply_markup=REMOVE_KEYBOARD,
     )
 
 
 @router.message(RegistrationStates.waiting_for_phone)
-async def handle_phone_text(message: Message, state: FSMContext) -> None:
+async def handle_phone_text(message: Message, state: FSMContext, text: str) -> None:
     try:
-        phone = normalize_phone(message.text or "")
+        phone = normalize_phone(text)
     except ValidationException as exc:
         await message.answer(exc.message)
         return
 
     await state.update_data(phone=phone)
     await state.set_state(RegistrationStates.waiting_for_last_name)
-    await message.answer("Спасибо! Введи, пожалуйста, фамилию.", reply_markup=ReplyKeyboardRemove())
+    await message.answer("Спасибо! Введи, пожалуйста, фамилию.", reply_markup=REMOVE_KEYBOARD)
 
 
 @router.message(RegistrationStates.waiting_for_last_name)
-async def handle_last_name(message: Message, state: FSMContext) -> None:
+async def handle_last_name(message: Message, state: FSMContext, text: str) -> None:
     try:
-        last_name = validate_name(message.text or "", "Фамилия")
+        last_name = validate_name(text, "Фамилия")
     except ValidationException as exc:
         await message.answer(exc.message)
         return
@@ -173,9 +229,9 @@ async def handle_last_name(message: Message, state: FSMContext) -> None:
 
 
 @router.message(RegistrationStates.waiting_for_first_name)
-async def handle_first_name(message: Message, state: FSMContext) -> None:
+async def handle_first_name(message: Message, state: FSMContext, text: str) -> None:
     try:
-        first_name = validate_name(message.text or "", "Имя")
+        first_name = validate_name(text, "Имя")
     except ValidationException as exc:
         await message.answer(exc.message)
         return
@@ -186,68 +242,81 @@ async def handle_first_name(message: Message, state: FSMContext) -> None:
 
 
 @router.message(RegistrationStates.waiting_for_patronymic)
-async def handle_patronymic(message: Message, state: FSMContext) -> None:
-    value = (message.text or "").strip()
-    patronymic = value if value and value != "-" else ""
-    await state.update_data(patronymic=patronymic)
+async def handle_patronymic(message: Message, state: FSMContext, text: str) -> None:
+    if text and text != "-":
+        await state.update_data(patronymic=text)
     await state.set_state(RegistrationStates.waiting_for_gender)
-    await message.answer(
-        "Выбери, пожалуйста, пол.",
-        reply_markup=gender_keyboard(),
-    )
+    await message.answer(GENDER_PROMPT, reply_markup=GENDER_KEYBOARD)
 
 
-@router.message(RegistrationStates.waiting_for_gender)
-async def handle_gender(message: Message, state: FSMContext) -> None:
-    gender = (message.text or "").strip()
-    if gender not in GENDERS:
-        await message.answer("Выбери вариант из списка, пожалуйста.")
+@router.callback_query(RegistrationStates.waiting_for_gender, F.data.startswith(GENDER_PREFIX))
+async def handle_gender_choice(callback: CallbackQuery, state: FSMContext) -> None:
+    await callback.answer()
+    index = callback.data[len(GENDER_PREFIX):]
+    if not index.isdecimal() or int(index) >= len(GENDERS):
         return
 
+    gender = GENDERS[int(index)]
     await state.update_data(gender=gender)
     await state.set_state(RegistrationStates.waiting_for_birthdate)
+    # Replace the buttons with the chosen value so they can't be tapped at later steps
+    try:
+        await callback.message.edit_text(f"{GENDER_PROMPT}\n\nПол: {gender}", reply_markup=None)
+    except Exception as e:
+        logger.warning("gender_keyboard_remove_failed", error=str(e))
+    await callback.message.answer("Укажи дату рождения в формате ДД.ММ.ГГГГ, пожалуйста.")
+
+
+@router.message(RegistrationStates.waiting_for_gender)
+async def handle_gender(message: Message, state: FSMContext, text: str) -> None:
+    # Typed answers and reply keyboards sent before the switch to inline buttons
+    if text not in _GENDERS_SET:
+        await message.answer("Выбери вариант из списка, пожалуйста.", reply_markup=GENDER_KEYBOARD)
+        return
+
+    await state.update_data(gender=text)
+    await state.set_state(RegistrationStates.waiting_for_birthdate)
     await message.answer(
         "Укажи дату рождения в формате ДД.ММ.ГГГГ, пожалуйста.",
-        reply_markup=ReplyKeyboardRemove(),
+        reply_markup=REMOVE_KEYBOARD,
     )
 
 
 @router.message(RegistrationStates.waiting_for_birthdate)
-async def handle_birthdate(message: Message, state: FSMContext) -> None:
+async def handle_birthdate(message: Message, state: FSMContext, text: str) -> None:
     try:
-        birthdate = parse_birthdate(message.text or "")
+        birthdate = parse_birthdate(text)
     except ValidationException as exc:
         await message.answer(exc.message)
         return
 
-    await state.update_data(
-        birthdate=birthdate.strftime("%d.%m.%Y"),
-        birthdate_obj=birthdate,
-    )
+    # Stored once as a date; the summary template formats it for display
+    await state.update_data(birthdate=birthdate)
     await state.set_state(RegistrationStates.waiting_for_city)
     await message.answer("Напиши, пожалуйста, город проживания.")
 
 
 @router.message(RegistrationStates.waiting_for_city)
-async def handle_city(message: Message, state: FSMContext) -> None:
+async def handle_city(message: Message, state: FSMContext, text: str) -> None:
     try:
-        city = validate_city(message.text or "")
+        city = validate_city(text)
     except ValidationException as exc:
         await message.answer(exc.message)
         return
 
-    await state.update_data(city=city)
-    data = await state.get_data()
+    data = await state.update_data(city=city)
     await state.set_state(RegistrationStates.confirmation)
     await message.answer(
         format_summary(data),
-        reply_markup=confirmation_keyboard().as_markup(),
+        reply_markup=CONFIRMATION_MARKUP,
     )
 
 
 @router.callback_query(RegistrationStates.confirmation, F.data == "change_registration")
 async def change_registration(callback: CallbackQuery, state: FSMContext) -> None:
     await callback.answer()
+    # handle_patronymic only stores a non-empty value, so drop the previous one here
+    await state.update_data(patronymic=None)
     await state.set_state(RegistrationStates.waiting_for_last_name)
     await callback.message.answer("Хорошо, начнём с фамилии. Напиши, пожалуйста, снова.")
 
@@ -257,30 +326,30 @@ async def confirm_registration(
     callback: CallbackQuery,
     state: FSMContext,
     bot_data: dict,
+    planfix_client: PlanfixClient | None = None,
 ) -> None:
-    await callback.answer()
+    # The callback is acknowledged in parallel with the first Planfix call below
     # Ensure telegram_id is saved in state (update if missing)
-    if callback.from_user:
-        current_data = await state.get_data()
-        if not current_data.get("telegram_id"):
-            await state.update_data(
-                telegram_id=callback.from_user.id,
-                telegram_username=callback.from_user.username,
-            )
     data = await state.get_data()
+    if callback.from_user and not data.get("telegram_id"):
+        data = await state.update_data(
+            telegram_id=callback.from_user.id,
+            telegram_username=callback.from_user.username,
+        )
     logger.info("confirm_registration", telegram_id=data.get("telegram_id"), telegram_username=data.get("telegram_username"))
     contact_data = build_contact_data(data)
     logger.info("contact_data_built", telegram_id=contact_data.telegram_id, telegram_username=contact_data.telegram_username)
 
-    client: PlanfixClient | None = bot_data.get("planfix_client")
+    client = planfix_client
     if client is None:
+        await callback.answer()
         logger.error("planfix_client_not_initialized")
         await callback.message.answer(
             "Произошла внутренняя ошибка. Пожалуйста, попробуй позже.",
         )
         return
     try:
-        existing = await client.list_contacts_by_phone(contact_data.phone)
+        existing = await _with_callback_ack(callback, _find_contacts_by_phone(client, contact_data.phone))
     except PlanfixError as exc:
         logger.error("planfix_search_failed", error=str(exc))
         await callback.message.answer(
@@ -292,13 +361,17 @@ async def confirm_registration(
         existing_id = int(existing[0]["id"])
         await state.update_data(existing_contact_id=existing_id)
         await state.set_state(RegistrationStates.duplicate_confirmation)
+        if callback.from_user:
+            _pending_contacts[callback.from_user.id] = contact_data
+            while len(_pending_contacts) > PENDING_CONTACTS_MAX:
+                del _pending_contacts[next(iter(_pending_contacts))]
         await callback.message.answer(
             "Контакт с таким номером уже зарегистрирован. Обновить данные?",
-            reply_markup=duplicate_keyboard().as_markup(),
+            reply_markup=DUPLICATE_MARKUP,
         )
         return
 
-    await _create_contact(callback, state, contact_data, bot_data)
+    await _create_contact(callback, state, contact_data, bot_data, client)
 
 
 @router.callback_query(
@@ -307,6 +380,8 @@ async def confirm_registration(
 )
 async def duplicate_cancel(callback: CallbackQuery, state: FSMContext) -> None:
     await callback.answer()
+    if callback.from_user:
+        _pending_contacts.pop(callback.from_user.id, None)
     await state.clear()
     await callback.message.answer(
         "Хорошо, если решишь попробовать снова — просто напиши /start.",
@@ -321,21 +396,65 @@ async def duplicate_update(
     callback: CallbackQuery,
     state: FSMContext,
     bot_data: dict,
+    planfix_client: PlanfixClient | None = None,
 ) -> None:
-    await callback.answer()
-    # Ensure telegram_id is saved in state (update if missing)
-    if callback.from_user:
-        current_data = await state.get_data()
-        if not current_data.get("telegram_id"):
-            await state.update_data(
+    # The callback is acknowledged in parallel with the first Planfix call below
+    contact_data = _pending_contacts.pop(callback.from_user.id, None) if callback.from_user else None
+    if contact_data is None:
+        # Not built in this process (e.g. after a restart); rebuild from FSM state
+        data = await state.get_data()
+        if callback.from_user and not data.get("telegram_id"):
+            data = await state.update_data(
                 telegram_id=callback.from_user.id,
                 telegram_username=callback.from_user.username,
             )
-    data = await state.get_data()
-    logger.info("duplicate_update", telegram_id=data.get("telegram_id"), telegram_username=data.get("telegram_username"))
-    contact_data = build_contact_data(data)
-    logger.info("contact_data_built_duplicate", telegram_id=contact_data.telegram_id, telegram_username=contact_data.telegram_username)
-    await _create_contact(callback, state, contact_data, bot_data, update_existing=True)
+        contact_data = build_contact_data(data)
+    logger.info("duplicate_update", telegram_id=contact_data.telegram_id, telegram_username=contact_data.telegram_username)
+    await _with_callback_ack(
+        callback,
+        _create_contact(callback, state, contact_data, bot_data, planfix_client, update_existing=True),
+    )
+
+
+async def _find_contacts_by_phone(client: PlanfixClient, phone: str) -> list[dict[str, Any]]:
+    """Search Planfix contacts by phone, warming the contact template cache alongside.
+
+    ensure_contact needs the template next. If either request fails, the TaskGroup
+    cancels the other one and its error is raised as is, the same way gather() reports it.
+    """
+    try:
+        async with asyncio.TaskGroup() as tg:
+            contacts = tg.create_task(client.list_contacts_by_phone(phone))
+            tg.create_task(client.get_contact_template())
+    except BaseExceptionGroup as group:
+        raise group.exceptions[0] from None
+    return contacts.result()
+
+
+async def _answer_callback(callback: CallbackQuery) -> None:
+    """Answer the callback query; a failed answer only costs the client its spinner."""
+    try:
+        await callback.answer()
+    except Exception as exc:
+        logger.warning("callback_answer_failed", error=str(exc))
+
+
+async def _with_callback_ack(callback: CallbackQuery, awaitable: Awaitable[T]) -> T:
+    """Await ``awaitable`` while answering the callback query concurrently.
+
+    Both run in one TaskGroup, so cancelling the handler cancels the answer too. A
+    failure of ``awaitable`` is raised only after the answer has gone out.
+    """
+    error: Exception | None = None
+    async with asyncio.TaskGroup() as tg:
+        tg.create_task(_answer_callback(callback))
+        try:
+            result = await awaitable
+        except Exception as exc:
+            error = exc
+    if error is not None:
+        raise error
+    return result
 
 
 async def _create_contact(
@@ -343,10 +462,10 @@ async def _create_contact(
     state: FSMContext,
     contact_data: ContactData,
     bot_data: dict,
+    client: PlanfixClient | None,
     *,
     update_existing: bool = False,
 ) -> None:
-    client: PlanfixClient | None = bot_data.get("planfix_client")
     if client is None:
         logger.error("planfix_client_not_initialized")
         await callback.message.answer(
@@ -417,24 +536,24 @@ async def _create_contact(
             try:
                 contact_url = None
                 if planfix_base_url:
-                    contact_url = f"{planfix_base_url.rstrip('/')}/contact/{contact_id}"
+                    contact_url = f"{planfix_base_url}contact/{contact_id}"
 
-                message = (
-                    "Новая регистрация Тайного гостя.\n"
-                    f"Телефон: {contact_data.phone}\n"
-                    f"Planfix ID: {contact_id}"
-                )
+                parts = [
+                    "Новая регистрация Тайного гостя.",
+                    f"Телефон: {contact_data.phone}",
+                    f"Planfix ID: {contact_id}",
+                ]
                 if contact_data.telegram_username:
                     username = contact_data.telegram_username
                     if not username.startswith("@"):
                         username = f"@{username}"
-                    message += f"\nTelegram: {username}"
+                    parts.append(f"Telegram: {username}")
                 elif contact_data.telegram_id:
-                    message += f"\nTelegram ID: {contact_data.telegram_id}"
+                    parts.append(f"Telegram ID: {contact_data.telegram_id}")
                 if contact_url:
-                    message += f"\nСсылка: {contact_url}"
+                    parts.append(f"Ссылка: {contact_url}")
 
-                await callback.bot.send_message(int(admin_chat_id), message)
+                _admin_notifications.put_nowait((int(admin_chat_id), "\n".join(parts)))
             except Exception as exc:  # pragma: no cover - logging safeguard
                 logger.error("admin_notification_failed", error=str(exc))
         elif admin_name:
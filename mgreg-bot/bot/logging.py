@@ -5,9 +5,20 @@ from __future__ import annotations
 import logging
 from typing import Any
 
+import orjson
 import structlog
 
 
+def _orjson_dumps(value: Any, **kwargs: Any) -> str:
+    """JSON serializer for structlog's JSONRenderer backed by orjson."""
+
+    return orjson.dumps(
+        value,
+        default=kwargs.get("default"),
+        option=orjson.OPT_NON_STR_KEYS,
+    ).decode()
+
+
 def configure_logging(level: int = logging.INFO) -> None:
     """Configure logging for the application."""
 
@@ -21,15 +32,16 @@ def configure_logging(level: int = logging.INFO) -> None:
     structlog.configure(
         processors=[
             *shared_processors,
-            structlog.processors.UnicodeDecoder(),
             structlog.stdlib.ProcessorFormatter.wrap_for_formatter,
         ],
         logger_factory=structlog.stdlib.LoggerFactory(),
+        # Calls below ``level`` return immediately, before any processor runs
+        wrapper_class=structlog.make_filtering_bound_logger(level),
         cache_logger_on_first_use=True,
     )
 
     formatter = structlog.stdlib.ProcessorFormatter(
-        processor=structlog.processors.JSONRenderer(),
+        processor=structlog.processors.JSONRenderer(serializer=_orjson_dumps),
         foreign_pre_chain=shared_processors,
     )
 
@@ -4,6 +4,7 @@ from __future__ import annotations
 
 import asyncio
 from contextlib import asynccontextmanager
+from types import MappingProxyType
 
 import uvicorn
 from aiogram import Bot, Dispatcher
@@ -12,12 +13,11 @@ from aiogram.enums import ParseMode
 
 from bot.config import get_settings
 from bot.database import get_database
-from bot.handlers import invitations_router, registration_router
+from bot.handlers import admin_notification_worker, invitations_router, registration_router
 from bot.logging import configure_logging, get_logger
-from bot.middleware import BotDataMiddleware
 from bot.scheduler import shutdown_scheduler, start_scheduler
 from bot.services.planfix import PlanfixClient
-from bot.webhook_server import app as webhook_app, set_bot_instance, set_planfix_client
+from bot.webhook_server import app as webhook_app, get_planfix_client, set_bot_instance, set_dispatcher, set_planfix_client
 
 
 logger = get_logger(__name__)
@@ -29,32 +29,53 @@ async def lifespan(app):
     # Startup
     settings = get_settings()
     db = get_database(settings.database_path)
+    # No-op when main() already initialized the schema before starting polling
     await db.init()
     
-    # Initialize Planfix client for webhook server
-    planfix_client_webhook = PlanfixClient(
-        base_url=str(settings.planfix_base_url),
-        token=settings.planfix_token,
-        template_id=settings.planfix_template_id,
-    )
-    set_planfix_client(planfix_client_webhook)
+    # main() shares the bot's Planfix client (one HTTP/2 pool and template cache);
+    # only create one here when the webhook app runs on its own
+    planfix_client_webhook = None
+    if get_planfix_client() is None:
+        planfix_client_webhook = PlanfixClient(
+            base_url=settings.planfix_base_url_str,
+            token=settings.planfix_token,
+            template_id=settings.planfix_template_id,
+            pool_size=settings.planfix_pool_size,
+        )
+        set_planfix_client(planfix_client_webhook)
     
     start_scheduler()
     yield
     # Shutdown
     shutdown_scheduler()
     # Cleanup Planfix client
-    await planfix_client_webhook.close()
+    if planfix_client_webhook is not None:
+        await planfix_client_webhook.close()
 
 
 webhook_app.router.lifespan_context = lifespan
 
 
+async def on_startup(bot: Bot, dispatcher: Dispatcher) -> None:
+    logger.info("bot_startup")
+    # Scheduler is started in lifespan context manager
+    dispatcher["admin_notification_task"] = asyncio.create_task(admin_notification_worker(bot))
+
+
+async def on_shutdown(dispatcher: Dispatcher) -> None:
+    logger.info("bot_shutdown")
+    # Scheduler is stopped in lifespan context manager; the shared Planfix client
+    # is closed by main() once both polling and the webhook server have stopped
+    admin_notification_task = dispatcher.get("admin_notification_task")
+    if admin_notification_task is not None:
+        admin_notification_task.cancel()
+
+
 async def main() -> None:
     configure_logging()
     settings = get_settings()
 
-    # Initialize database
+    # Initialize database before polling starts; the webhook lifespan reuses it
     db = get_database(settings.database_path)
     await db.init()
 
@@ -65,43 +86,32 @@ async def main() -> None:
     dp = Dispatcher()
 
     planfix_client = PlanfixClient(
-        base_url=str(settings.planfix_base_url),
+        base_url=settings.planfix_base_url_str,
         token=settings.planfix_token,
         template_id=settings.planfix_template_id,
+        pool_size=settings.planfix_pool_size,
     )
 
-    # Store data in dict (accessible in handlers via bot_data parameter through middleware)
+    # Store data in dict (accessible in handlers via bot_data parameter through dispatcher workflow data)
     bot_data = {
         "admin_chat_id": settings.admin_chat_id,
         "admin_name": settings.admin_name,
-        "planfix_base_url": str(settings.planfix_base_url),
-        "planfix_client": planfix_client,
+        "planfix_base_url": settings.planfix_base_url_str,
         "settings": settings,
     }
 
-    # Set bot instance for webhook server
+    # Set bot instance and shared Planfix client for webhook server
     set_bot_instance(bot)
-
-    # Register middleware to inject bot_data into handlers
-    bot_data_middleware = BotDataMiddleware(bot_data)
-    registration_router.message.middleware(bot_data_middleware)
-    registration_router.callback_query.middleware(bot_data_middleware)
-    invitations_router.callback_query.middleware(bot_data_middleware)
+    set_planfix_client(planfix_client)
 
     dp.include_router(registration_router)
     dp.include_router(invitations_router)
 
-    async def on_startup_handler() -> None:
-        logger.info("bot_startup")
-        # Scheduler is started in lifespan context manager
-
-    async def on_shutdown_handler() -> None:
-        logger.info("bot_shutdown")
-        # Scheduler is stopped in lifespan context manager
-        await planfix_client.close()
-
-    dp.startup.register(on_startup_handler)
-    dp.shutdown.register(on_shutdown_handler)
+    # Dispatcher workflow data is injected into startup/shutdown hooks and handlers
+    dp["planfix_client"] = planfix_client
+    dp["bot_data"] = MappingProxyType(bot_data)
+    dp.startup.register(on_startup)
+    dp.shutdown.register(on_shutdown)
 
     # Start webhook server in background
     config = uvicorn.Config(
@@ -112,16 +122,44 @@ async def main() -> None:
     )
     server = uvicorn.Server(config)
 
-    logger.info("bot_polling_start", webhook_port=settings.webhook_port)
-
-    # Run bot and webhook server concurrently
     try:
-        await asyncio.gather(
-            dp.start_polling(bot),
-            server.serve(),
-        )
+        if settings.telegram_webhook:
+            await run_webhook(bot, dp, server, settings)
+        else:
+            # Telegram refuses getUpdates while a webhook is registered, e.g. one left
+            # behind by an earlier run with TELEGRAM_WEBHOOK=true
+            await bot.delete_webhook()
+            logger.info("bot_polling_start", webhook_port=settings.webhook_port)
+            # Run bot and webhook server concurrently
+            await asyncio.gather(
+                dp.start_polling(bot),
+                server.serve(),
+            )
     finally:
         await planfix_client.close()
+        await db.close()
+
+
+async def run_webhook(bot: Bot, dp: Dispatcher, server: uvicorn.Server, settings) -> None:
+    """Receive Telegram updates through the webhook server instead of long polling."""
+    if not settings.telegram_webhook_secret:
+        # Without it anyone who finds the endpoint could post forged updates
+        raise RuntimeError("TELEGRAM_WEBHOOK_SECRET must be set when TELEGRAM_WEBHOOK is enabled")
+    # Same workflow data start_polling() would pass to the startup/shutdown hooks
+    workflow_data = {"dispatcher": dp, "bots": [bot], **dp.workflow_data}
+    set_dispatcher(dp)
+    await dp.emit_startup(bot=bot, **workflow_data)
+    try:
+        webhook_url = settings.webhook_base_url.rstrip("/") + "/webhooks/telegram"
+        await bot.set_webhook(
+            url=webhook_url,
+            secret_token=settings.telegram_webhook_secret,
+        )
+        logger.info("bot_webhook_start", url=webhook_url, webhook_port=settings.webhook_port)
+        await server.serve()
+    finally:
+        await dp.emit_shutdown(bot=bot, **workflow_data)
+        await bot.session.close()
 
 
 if __name__ == "__main__":
@@ -2,25 +2,47 @@
 
 from __future__ import annotations
 
-from datetime import datetime, timezone
+import asyncio
+import re
+from dataclasses import dataclass, field
+from datetime import datetime
+from functools import lru_cache
 
 from apscheduler.schedulers.asyncio import AsyncIOScheduler
-from apscheduler.triggers.date import DateTrigger
 from apscheduler.triggers.interval import IntervalTrigger
 
+from bot import webhook_server
 from bot.config import get_settings
 from bot.database import get_database
+from bot.handlers.invitations import build_webapp_keyboard, generate_webapp_url
 from bot.logging import get_logger
 from bot.services.planfix import PlanfixClient, PlanfixError
 
 logger = get_logger(__name__)
-settings = get_settings()
 scheduler = AsyncIOScheduler()
 
+_DATE_ISO_RE = re.compile(r"(\d{4})-(\d{2})-(\d{2})")
+_DATE_DMY_RE = re.compile(r"(\d{1,2})([-.])(\d{1,2})\2(\d{4})")
+
+# The retry job runs every RETRY_INTERVAL_MIN seconds while there is work and backs off
+# (doubling) to RETRY_INTERVAL_MAX while there is none
+RETRY_INTERVAL_MIN = 30
+RETRY_INTERVAL_MAX = 300
+_retry_interval = RETRY_INTERVAL_MIN
+
+# All expired deadlines are picked up by one periodic scan instead of a job per task
+DEADLINE_SCAN_INTERVAL = 60
+
+# Per-task backoff after a failed attempt: RETRY_TASK_BACKOFF * 2**attempts, capped
+RETRY_TASK_BACKOFF = 30
+RETRY_TASK_BACKOFF_MAX = 3600
+# Enough doublings to reach the cap; a larger shift would overflow SQLite's 64-bit integers
+_RETRY_TASK_BACKOFF_SHIFT_MAX = (RETRY_TASK_BACKOFF_MAX // RETRY_TASK_BACKOFF).bit_length()
+
 
 async def check_task_deadline(task_id: int, client: PlanfixClient) -> None:
     """Check if task deadline has passed and form was not submitted."""
-    """Check if task deadline passed and handle accordingly."""
+    settings = get_settings()
     db = get_database()
 
     # Check if form was completed
@@ -40,15 +62,16 @@ async def check_task_deadline(task_id: int, client: PlanfixClient) -> None:
     # Task not completed - cancel it
     try:
         if settings.status_cancelled_id:
-            await client.update_task(int(task_id), status=settings.status_cancelled_id)
+            planfix_task_id = int(task_id)
+            await client.update_task(planfix_task_id, status=settings.status_cancelled_id)
             await client.add_task_comment(
-                int(task_id),
+                planfix_task_id,
                 "⏰ Дедлайн истёк. Проверка не была пройдена. Задача отменена.",
             )
             logger.info("task_deadline_cancelled", task_id=task_id)
 
             # Notify admin (bot instance should be set via webhook_server)
-            from bot.webhook_server import bot_instance
+            bot_instance = webhook_server.bot_instance
             admin_chat_id = settings.admin_chat_id
             if admin_chat_id and bot_instance:
                 try:
@@ -63,40 +86,81 @@ async def check_task_deadline(task_id: int, client: PlanfixClient) -> None:
         logger.error("task_deadline_check_failed", task_id=task_id, error=str(e))
 
 
-async def schedule_deadline_check(task_id: int, deadline_str: str, client: PlanfixClient) -> None:
-    """Schedule deadline check for task.
-    
+@lru_cache(maxsize=1024)
+def parse_deadline(deadline_str: str) -> datetime:
+    """Parse a deadline in ISO (YYYY-MM-DD[THH:MM...]), DD-MM-YYYY or DD.MM.YYYY format."""
+    # Plain dates are the common case; build them directly instead of via strptime
+    match = _DATE_ISO_RE.fullmatch(deadline_str)
+    if match:
+        year, month, day = match.groups()
+        return datetime(int(year), int(month), int(day))
+    match = _DATE_DMY_RE.fullmatch(deadline_str)
+    if match:
+        day, _, month, year = match.groups()
+        return datetime(int(year), int(month), int(day))
+    return datetime.fromisoformat(deadline_str.replace("Z", "+00:00"))
+
+
+async def schedule_deadline_check(task_id: int, deadline_str: str) -> None:
+    """Arm the deadline check for task.
+
+    The deadline itself is stored in the tasks table by the webhook handlers; this
+    validates it and clears the checked mark so scan_expired_deadlines picks it up.
+
     Args:
         task_id: Task ID (must be int)
         deadline_str: Deadline in ISO format (YYYY-MM-DD) or Planfix format (DD-MM-YYYY)
-        client: Planfix client instance
     """
+    db = get_database()
     try:
-        # Parse deadline - try ISO format first
+        deadline = parse_deadline(deadline_str)
+    except ValueError as e:
+        # Nothing to check against; keep the scan from comparing an unparseable string
+        logger.error("deadline_schedule_failed", task_id=task_id, error=str(e))
+        await db.execute(
+            "UPDATE tasks SET deadline_checked_at = CURRENT_TIMESTAMP WHERE task_id = ?",
+            (task_id,),
+        )
+        return
+
+    await db.execute("UPDATE tasks SET deadline_checked_at = NULL WHERE task_id = ?", (task_id,))
+    logger.info("deadline_scheduled", task_id=task_id, deadline=deadline.isoformat())
+
+
+async def scan_expired_deadlines() -> None:
+    """Run the deadline check for every task whose deadline has passed since the last scan."""
+    planfix_client = webhook_server.planfix_client
+    if not planfix_client:
+        logger.warning("planfix_client_not_available_for_deadlines")
+        return
+
+    db = get_database()
+    # Deadlines are ISO dates (YYYY-MM-DD) naming the last day of the check, so a task
+    # expires once that whole day has passed, not at its first midnight
+    rows = await db.fetch_all(
+        """
+        SELECT task_id, deadline FROM tasks
+        WHERE deadline_checked_at IS NULL AND deadline != '' AND date(deadline) < date('now')
+          AND coalesce(status, '') NOT IN ('cancelled_deadline', 'cancelled_manual')
+        """
+    )
+    if not rows:
+        return
+
+    logger.info("deadline_scan_expired", count=len(rows))
+    for row in rows:
         try:
-            deadline = datetime.fromisoformat(deadline_str.replace("Z", "+00:00"))
-        except ValueError:
-            # Try Planfix format (DD-MM-YYYY)
-            try:
-                deadline = datetime.strptime(deadline_str, "%d-%m-%Y")
-            except ValueError:
-                # Try DD.MM.YYYY format
-                deadline = datetime.strptime(deadline_str, "%d.%m.%Y")
-        
-        if deadline.tzinfo is None:
-            deadline = deadline.replace(tzinfo=timezone.utc)
-
-        # Schedule job
-        scheduler.add_job(
-            check_task_deadline,
-            trigger=DateTrigger(run_date=deadline),
-            args=[task_id, client],
-            id=f"deadline_{task_id}",
-            replace_existing=True,
+            await check_task_deadline(row["task_id"], planfix_client)
+        except Exception as e:
+            logger.error("task_deadline_check_error", task_id=row["task_id"], error=str(e))
+
+    # Mark only the deadline that was checked: a task re-armed with a new deadline
+    # while the scan ran keeps its mark cleared for the next scan
+    async with db.transaction() as conn:
+        await conn.executemany(
+            "UPDATE tasks SET deadline_checked_at = CURRENT_TIMESTAMP WHERE task_id = ? AND deadline = ?",
+            [(row["task_id"], row["deadline"]) for row in rows],
         )
-        logger.info("deadline_scheduled", task_id=task_id, deadline=deadline.isoformat())
-    except Exception as e:
-        logger.error("deadline_schedule_failed", task_id=task_id, error=str(e))
 
 
 def start_scheduler() -> None:
@@ -104,19 +168,103 @@ def start_scheduler() -> None:
     if not scheduler.running:
         scheduler.start()
         logger.info("scheduler_started")
-        
-        # Schedule periodic retry of executor assignments (every 30 seconds)
+
         scheduler.add_job(
-            retry_executor_assignments,
-            trigger=IntervalTrigger(seconds=30),
-            id="retry_executor_assignments",
+            scan_expired_deadlines,
+            trigger=IntervalTrigger(seconds=DEADLINE_SCAN_INTERVAL),
+            id="scan_expired_deadlines",
             replace_existing=True,
         )
-        logger.info("retry_executor_assignments_job_scheduled")
+        logger.info("deadline_scan_job_scheduled")
+
+        # Schedule periodic retry of executor assignments (interval adapts to the backlog)
+        if get_settings().retry_enabled:
+            scheduler.add_job(
+                retry_executor_assignments,
+                trigger=IntervalTrigger(seconds=_retry_interval),
+                id="retry_executor_assignments",
+                replace_existing=True,
+            )
+            logger.info("retry_executor_assignments_job_scheduled")
     else:
         logger.info("scheduler_already_running")
 
 
+@dataclass(frozen=True, slots=True)
+class _RetryTask:
+    """A reserved task row, normalized once per cycle for the Planfix calls."""
+
+    task_id: int
+    nomber: str
+    guest_id: int
+    guest_id_pattern: re.Pattern[str]
+
+    @classmethod
+    def from_row(cls, row) -> _RetryTask:
+        guest_id = row["assigned_guest_id"]
+        # User ID can be in formats: "contact:427", "user:5", or just "427"
+        pattern = re.compile(rf"(?:.*:)?{re.escape(str(guest_id))}")
+        return cls(row["task_id"], str(row["nomber"]), guest_id, pattern)
+
+
+@dataclass(slots=True)
+class _RetryCycleUpdates:
+    """Task row changes collected during one retry cycle and written together."""
+
+    confirmed: list[tuple[int]] = field(default_factory=list)
+    assignment_messages: list[tuple[int, int, int]] = field(default_factory=list)
+
+
+def _adjust_retry_interval(had_work: bool) -> None:
+    """Reset the retry job interval when there was work, otherwise back it off."""
+    global _retry_interval
+    interval = RETRY_INTERVAL_MIN if had_work else min(_retry_interval * 2, RETRY_INTERVAL_MAX)
+    if interval == _retry_interval:
+        return
+    _retry_interval = interval
+    if scheduler.get_job("retry_executor_assignments"):
+        scheduler.reschedule_job("retry_executor_assignments", trigger=IntervalTrigger(seconds=interval))
+        logger.debug("retry_executor_assignments_rescheduled", interval=interval)
+
+
+async def _defer_task_retry(db, task_id: int) -> None:
+    """Push the task's next retry out exponentially after a failed attempt."""
+    await db.execute(
+        """
+        UPDATE tasks
+        SET retry_attempts = retry_attempts + 1,
+            next_retry_at = datetime('now', '+' || min(? << min(retry_attempts, ?), ?) || ' seconds')
+        WHERE task_id = ?
+        """,
+        (RETRY_TASK_BACKOFF, _RETRY_TASK_BACKOFF_SHIFT_MAX, RETRY_TASK_BACKOFF_MAX, task_id),
+    )
+
+
+async def _add_assignment_comment(client: PlanfixClient, task_nomber: str, guest_planfix_id: int) -> None:
+    try:
+        await client.add_task_comment(
+            task_nomber,
+            f"✅ Гость (ID: {guest_planfix_id}) принял приглашение и назначен исполнителем.",
+        )
+    except PlanfixError as comment_error:
+        logger.warning("retry_comment_add_failed", task_nomber=task_nomber, error=str(comment_error))
+
+
+async def _set_waiting_form_status(client: PlanfixClient, task_nomber: str) -> None:
+    """Set status to 113 "Ожидаем визит", then 114 "Ожидаем анкету"."""
+    settings = get_settings()
+    if settings.status_waiting_visit_id:
+        try:
+            await client.update_task(task_nomber, status=settings.status_waiting_visit_id)
+        except PlanfixError as e:
+            logger.warning("retry_status_113_failed", task_nomber=task_nomber, error=str(e))
+    if settings.status_waiting_form_id:
+        try:
+            await client.update_task(task_nomber, status=settings.status_waiting_form_id)
+        except PlanfixError as e:
+            logger.warning("retry_status_114_failed", task_nomber=task_nomber, error=str(e))
+
+
 async def retry_executor_assignments() -> None:
     """Retry executor assignments for tasks that were reserved but executor not yet assigned in Planfix.
     
@@ -125,26 +273,32 @@ async def retry_executor_assignments() -> None:
     2. Task ID was received from Planfix webhook and saved to database
     3. Task becomes available later, and we need to assign executor
     """
+    settings = get_settings()
     db = get_database()
     
     # Get planfix_client from webhook_server
-    from bot.webhook_server import planfix_client
+    planfix_client = webhook_server.planfix_client
     if not planfix_client:
         logger.warning("planfix_client_not_available_for_retry")
         return
     
     # Find tasks with assigned_guest_id but check if executor is actually assigned in Planfix
     # Use nomber field for API calls (task number from webhook), not task_id
-    tasks = await db.fetch_all(
+    rows = await db.fetch_all(
         """
         SELECT task_id, nomber, assigned_guest_id 
         FROM tasks 
-        WHERE assigned_guest_id IS NOT NULL
-        ORDER BY created_at DESC
-        LIMIT 50
-        """
+        WHERE assigned_guest_id IS NOT NULL AND executor_confirmed_at IS NULL AND nomber IS NOT NULL
+          AND (next_retry_at IS NULL OR next_retry_at <= CURRENT_TIMESTAMP)
+        ORDER BY next_retry_at, task_id
+        LIMIT ?
+        """,
+        (settings.retry_batch_size,),
     )
+    # Planfix API expects nomber, not task_id; an empty nomber would return 400
+    tasks = [_RetryTask.from_row(row) for row in rows if row["nomber"]]
     
+    _adjust_retry_interval(bool(tasks))
     if not tasks:
         return
     
@@ -153,154 +307,137 @@ async def retry_executor_assignments() -> None:
         count=len(tasks),
         note="Checking tasks with assigned_guest_id. Task IDs come from Planfix webhooks."
     )
-    
-    for task_row in tasks:
-        # Use nomber field for API calls (task number from webhook), not task_id
-        # sqlite3.Row doesn't have .get() method, use direct access with try/except
-        try:
-            task_nomber = task_row["nomber"]
-            if task_nomber:
-                task_nomber = str(task_nomber)
-            else:
-                task_nomber = None
-        except (KeyError, TypeError):
-            task_nomber = None
-        
-        if not task_nomber:
-            # Skip - Planfix API expects nomber, not task_id; task would return 400
-            logger.debug("retry_skip_no_nomber", task_id=task_row["task_id"])
-            continue
-
-        guest_planfix_id = task_row["assigned_guest_id"]
 
-        try:
-            # Check if executor is already assigned in Planfix
-            # Use nomber (task number from webhook) for API calls
-            task = await planfix_client.get_task(task_nomber, fields="id,assignees")
-            assignees = task.get("assignees", {})
-            
-            # Handle both formats: object with "users" field or list
-            if isinstance(assignees, dict):
-                users = assignees.get("users", [])
-            elif isinstance(assignees, list):
-                users = assignees
-            else:
-                users = []
-            
-            # Check if our guest is already in assignees
-            # User ID can be in formats: "contact:427", "user:5", or just "427"
-            guest_assigned = False
-            for user in users:
-                user_id = str(user.get("id", ""))
-                # Check various formats
-                if (
-                    user_id.endswith(f":{guest_planfix_id}") or
-                    user_id == str(guest_planfix_id) or
-                    user_id == f"contact:{guest_planfix_id}"
-                ):
-                    guest_assigned = True
-                    break
-            
-            if guest_assigned:
-                # Already assigned, skip
-                logger.debug("executor_already_assigned", task_nomber=task_nomber, guest_id=guest_planfix_id)
-                continue
-
-            # Try to assign executor
-            logger.info("retry_executor_assignment", task_nomber=task_nomber, guest_id=guest_planfix_id)
-            await planfix_client.set_task_executors(task_nomber, [guest_planfix_id])
-            
-            # Try to add comment
+    # Per-task work runs concurrently, bounded so Planfix rate limits are respected
+    semaphore = asyncio.Semaphore(settings.retry_concurrency)
+    updates = _RetryCycleUpdates()
+
+    async def process(task: _RetryTask) -> None:
+        async with semaphore:
+            await _retry_executor_assignment(db, planfix_client, task, updates)
+
+    results = await asyncio.gather(*(process(row) for row in tasks), return_exceptions=True)
+    for task, result in zip(tasks, results):
+        if isinstance(result, Exception):
+            logger.error("retry_executor_assignment_error", task_id=task.task_id, error=str(result))
+
+    # Persist the cycle's results under one commit. Tasks that are still unconfirmed wait
+    # at least one cycle, so the rest of the backlog gets its turn (never-tried tasks sort first)
+    task_ids = [task.task_id for task in tasks]
+    async with db.transaction() as conn:
+        await conn.executemany(
+            "UPDATE tasks SET executor_confirmed_at = CURRENT_TIMESTAMP WHERE task_id = ?",
+            updates.confirmed,
+        )
+        await conn.executemany(
+            "UPDATE tasks SET assignment_chat_id = ?, assignment_message_id = ? WHERE task_id = ?",
+            updates.assignment_messages,
+        )
+        await conn.execute(
+            f"""
+            UPDATE tasks
+            SET last_attempt_at = CURRENT_TIMESTAMP,
+                next_retry_at = max(coalesce(next_retry_at, ''), datetime('now', '+{RETRY_INTERVAL_MIN} seconds'))
+            WHERE task_id IN ({",".join("?" * len(task_ids))}) AND executor_confirmed_at IS NULL
+            """,
+            tuple(task_ids),
+        )
+
+
+async def _retry_executor_assignment(
+    db, planfix_client: PlanfixClient, task: _RetryTask, updates: _RetryCycleUpdates
+) -> None:
+    """Check one reserved task in Planfix and assign its guest as executor if missing."""
+    settings = get_settings()
+    task_nomber = task.nomber
+    guest_planfix_id = task.guest_id
+
+    try:
+        # Check if executor is already assigned in Planfix
+        # Use nomber (task number from webhook) for API calls
+        planfix_task = await planfix_client.get_task(task_nomber, fields="id,assignees")
+        assignees = planfix_task.get("assignees", {})
+
+        # Handle both formats: object with "users" field or list
+        if isinstance(assignees, dict):
+            users = assignees.get("users", [])
+        elif isinstance(assignees, list):
+            users = assignees
+        else:
+            users = []
+
+        # Check if our guest is already in assignees
+        guest_assigned = any(task.guest_id_pattern.fullmatch(str(user.get("id", ""))) for user in users)
+
+        if guest_assigned:
+            # Already assigned; stop checking this task on later ticks
+            logger.debug("executor_already_assigned", task_nomber=task_nomber, guest_id=guest_planfix_id)
+            updates.confirmed.append((task.task_id,))
+            return
+
+        # Try to assign executor
+        logger.info("retry_executor_assignment", task_nomber=task_nomber, guest_id=guest_planfix_id)
+        await planfix_client.set_task_executors(task_nomber, [guest_planfix_id])
+        updates.confirmed.append((task.task_id,))
+
+        # The comment is independent of the status transition, so both go out together;
+        # the two statuses stay sequential because Planfix applies them in order
+        await asyncio.gather(
+            _add_assignment_comment(planfix_client, task_nomber, guest_planfix_id),
+            _set_waiting_form_status(planfix_client, task_nomber),
+        )
+
+        logger.info("retry_executor_assignment_success", task_nomber=task_nomber, guest_id=guest_planfix_id)
+
+        # Notify user via Telegram if bot instance is available
+        bot_instance = webhook_server.bot_instance
+        if bot_instance:
             try:
-                await planfix_client.add_task_comment(
-                    task_nomber,
-                    f"✅ Гость (ID: {guest_planfix_id}) принял приглашение и назначен исполнителем.",
+                # Get telegram_id from guest_planfix_id
+                guest_mapping = await db.fetch_one(
+                    "SELECT telegram_id FROM guest_telegram_map WHERE planfix_contact_id = ?",
+                    (guest_planfix_id,),
                 )
-            except PlanfixError as comment_error:
-                logger.warning("retry_comment_add_failed", task_nomber=task_nomber, error=str(comment_error))
+                if guest_mapping:
+                    telegram_id = guest_mapping["telegram_id"]
+                    # Try to get WebApp URL
+                    # Use task_id from DB for webapp (it expects task_id, not nomber)
+                    webapp_url = await generate_webapp_url(task.task_id, guest_planfix_id, settings, client=planfix_client)
+
+                    if webapp_url:
+                        msg = await bot_instance.send_message(
+                            telegram_id,
+                            "✅ Отлично! Ты теперь назначен(а) исполнителем задачи. Нажми «Начать прохождение», чтобы заполнить анкету.",
+                            reply_markup=build_webapp_keyboard(webapp_url),
+                        )
+                    else:
+                        msg = await bot_instance.send_message(
+                            telegram_id,
+                            "✅ Отлично! Ты теперь назначен(а) исполнителем задачи. Свяжемся с тобой для дальнейших инструкций.",
+                        )
+                    # Store message for deletion after form submission
+                    updates.assignment_messages.append((msg.chat.id, msg.message_id, task.task_id))
+            except Exception as e:
+                logger.warning("retry_user_notification_failed", task_nomber=task_nomber, error=str(e))
 
-            # Set status to 113 "Ожидаем визит", then 114 "Ожидаем анкету"
-            from bot.config import get_settings
-            s = get_settings()
-            if s.status_waiting_visit_id:
-                try:
-                    await planfix_client.update_task(task_nomber, status=s.status_waiting_visit_id)
-                except PlanfixError as e:
-                    logger.warning("retry_status_113_failed", task_nomber=task_nomber, error=str(e))
-            if s.status_waiting_form_id:
-                try:
-                    await planfix_client.update_task(task_nomber, status=s.status_waiting_form_id)
-                except PlanfixError as e:
-                    logger.warning("retry_status_114_failed", task_nomber=task_nomber, error=str(e))
-
-            logger.info("retry_executor_assignment_success", task_nomber=task_nomber, guest_id=guest_planfix_id)
-            
-            # Notify user via Telegram if bot instance is available
-            from bot.webhook_server import bot_instance
-            if bot_instance:
-                try:
-                    # Get telegram_id from guest_planfix_id
-                    guest_mapping = await db.fetch_one(
-                        "SELECT telegram_id FROM guest_telegram_map WHERE planfix_contact_id = ?",
-                        (guest_planfix_id,),
-                    )
-                    if guest_mapping:
-                        telegram_id = guest_mapping["telegram_id"]
-                        # Try to get WebApp URL
-                        from bot.handlers.invitations import generate_webapp_url
-                        # Use task_id from DB for webapp (it expects task_id, not nomber)
-                        task_id_for_webapp = task_row["task_id"]
-                        webapp_url = await generate_webapp_url(task_id_for_webapp, guest_planfix_id, settings, client=planfix_client)
-                        
-                        if webapp_url:
-                            from aiogram.types import InlineKeyboardButton, InlineKeyboardMarkup, WebAppInfo
-                            keyboard = InlineKeyboardMarkup(
-                                inline_keyboard=[
-                                    [
-                                        InlineKeyboardButton(
-                                            text="Начать прохождение",
-                                            web_app=WebAppInfo(url=webapp_url),
-                                        )
-                                    ]
-                                ]
-                            )
-                            msg = await bot_instance.send_message(
-                                telegram_id,
-                                "✅ Отлично! Ты теперь назначен(а) исполнителем задачи. Нажми «Начать прохождение», чтобы заполнить анкету.",
-                                reply_markup=keyboard,
-                            )
-                        else:
-                            msg = await bot_instance.send_message(
-                                telegram_id,
-                                "✅ Отлично! Ты теперь назначен(а) исполнителем задачи. Свяжемся с тобой для дальнейших инструкций.",
-                            )
-                        # Store message for deletion after form submission
-                        try:
-                            await db.execute(
-                                "UPDATE tasks SET assignment_chat_id = ?, assignment_message_id = ? WHERE task_id = ?",
-                                (msg.chat.id, msg.message_id, task_row["task_id"]),
-                            )
-                        except Exception as store_err:
-                            logger.warning("assignment_message_store_failed", task_id=task_row["task_id"], error=str(store_err))
-                except Exception as e:
-                    logger.warning("retry_user_notification_failed", task_nomber=task_nomber, error=str(e))
-                    
-        except PlanfixError as e:
-            if e.is_task_not_found():
-                # Task deleted/archived in Planfix - clear to stop retrying
-                try:
-                    await db.execute(
-                        "UPDATE tasks SET assigned_guest_id = NULL WHERE task_id = ? OR nomber = ?",
-                        (task_row["task_id"], task_nomber),
-                    )
-                    logger.info("retry_task_not_found_cleared", task_id=task_row["task_id"], task_nomber=task_nomber)
-                except Exception as db_err:
-                    logger.warning("retry_clear_failed", task_id=task_row["task_id"], error=str(db_err))
-            else:
-                # Other error, log it
-                logger.warning("retry_executor_assignment_failed", task_nomber=task_nomber, error=str(e))
-        except Exception as e:
-            logger.error("retry_executor_assignment_error", task_nomber=task_nomber, error=str(e))
+    except PlanfixError as e:
+        if e.is_task_not_found():
+            # Task deleted/archived in Planfix - clear to stop retrying
+            try:
+                await db.execute(
+                    "UPDATE tasks SET assigned_guest_id = NULL WHERE task_id = ? OR nomber = ?",
+                    (task.task_id, task_nomber),
+                )
+                logger.info("retry_task_not_found_cleared", task_id=task.task_id, task_nomber=task_nomber)
+            except Exception as db_err:
+                logger.warning("retry_clear_failed", task_id=task.task_id, error=str(db_err))
+        else:
+            # Other error, log it and back off this task
+            logger.warning("retry_executor_assignment_failed", task_nomber=task_nomber, error=str(e))
+            await _defer_task_retry(db, task.task_id)
+    except Exception as e:
+        logger.error("retry_executor_assignment_error", task_nomber=task_nomber, error=str(e))
+        await _defer_task_retry(db, task.task_id)
 
 
 def shutdown_scheduler() -> None:
@@ -4,12 +4,12 @@ from __future__ import annotations
 
 from dataclasses import dataclass
 from datetime import date
-from typing import Any, Dict
+from typing import Any, Dict, Final
 
 from pydantic import BaseModel, Field
 
 
-@dataclass
+@dataclass(slots=True, frozen=True)
 class ContactData:
     phone: str
     last_name: str
@@ -54,77 +54,133 @@ class PlanfixContactPayload(BaseModel):
         template: dict,
         template_id: int,
     ) -> "PlanfixContactPayload":
-        gender_map = {
-            "Мужской": "Male",
-            "Женский": "Female",
-            "Другой/Не хочу указывать": "Other",
-        }
-
-        custom_fields: list[Dict[str, Any]] = []
-
-        for field in template.get("customFields", []):
-            field_label = field.get("label") or field.get("name")
-            field_id = field.get("id")
-            if not field_id:
-                continue
-            label_lower = field_label.lower() if isinstance(field_label, str) else ""
-            if field_label == "Город" and data.city:
-                custom_fields.append({"field": {"id": int(field_id)}, "value": data.city})
-            if label_lower == "пол" and data.gender:
-                custom_fields.append(
-                    {
-                        "field": {"id": int(field_id)},
-                        "value": gender_map.get(data.gender, data.gender),
-                    }
-                )
-            if data.telegram_username:
-                username_clean = data.telegram_username.lstrip("@")
-                username_value = f"https://t.me/{username_clean}"
-                if (
-                    "telegram" in label_lower and "id" not in label_lower
-                    or "телеграм" in label_lower and "id" not in label_lower
-                    or ("ник" in label_lower and ("тел" in label_lower or "tg" in label_lower))
-                ):
-                    custom_fields.append(
-                        {
-                            "field": {"id": int(field_id)},
-                            "value": username_value,
-                        }
-                    )
-            if data.telegram_id and ("telegram" in label_lower and "id" in label_lower):
-                custom_fields.append(
-                    {
-                        "field": {"id": int(field_id)},
-                        "value": str(data.telegram_id),
-                    }
-                )
-
-        phones = [{"number": data.phone, "type": 1}]
-
-        birth_date = {
-            "date": data.birthdate.strftime("%d-%m-%Y"),
-        }
-
-        source_object_id = str(data.telegram_id) if data.telegram_id is not None else None
-        telegram_link: str | None = None
-        if data.telegram_username:
-            username_clean = data.telegram_username.lstrip("@")
-            telegram_link = f"https://t.me/{username_clean}"
-
-        return cls(
-            template={"id": template_id},
-            lastname=data.last_name,
-            name=data.first_name,
-            midname=data.patronymic or "",
-            gender=gender_map.get(data.gender, data.gender),
-            address=data.city,
-            birthDate=birth_date,
-            phones=phones,
-            customFieldData=custom_fields or None,
-            isCompany=False,
-            isDeleted=False,
-            sourceObjectId=source_object_id,
-            telegram=telegram_link,
-            telegramId=str(data.telegram_id) if data.telegram_id is not None else None,
+        return cls(**build_contact_payload(data, template=template, template_id=template_id))
+
+
+WEBAPP_FORM_DEFAULT = "resto_a"
+WEBAPP_FORM_DELIVERY = "delivery_a"
+
+
+def webapp_form_for_task(task_name: str | None) -> str:
+    """Pick the WebApp form for a Planfix task from its name."""
+
+    name = (task_name or "").lower()
+    if "доставка" in name or "delivery" in name:
+        return WEBAPP_FORM_DELIVERY
+    return WEBAPP_FORM_DEFAULT
+
+
+TEMPLATE_FIELD_INDEX_KEY = "_field_roles"
+
+_GENDER_MAP: Final[Dict[str, str]] = {
+    "Мужской": "Male",
+    "Женский": "Female",
+    "Другой/Не хочу указывать": "Other",
+}
+
+
+@dataclass(slots=True, frozen=True)
+class TemplateFieldRoles:
+    """Custom field ids of a contact template, resolved by what they hold."""
+
+    city: int | None = None
+    gender: int | None = None
+    # (field_id, holds_telegram_link, holds_telegram_id) in template order
+    telegram: tuple[tuple[int, bool, bool], ...] = ()
+
+
+def _is_telegram_link_label(label: str) -> bool:
+    return (
+        "telegram" in label and "id" not in label
+        or "телеграм" in label and "id" not in label
+        or ("ник" in label and ("тел" in label or "tg" in label))
+    )
+
+
+def index_template_fields(template: dict) -> TemplateFieldRoles:
+    """Resolve the contact template's custom fields to roles in one pass over the labels."""
+
+    label_to_id: Dict[str, int] = {}
+    for field in template.get("customFields", []):
+        field_label = field.get("label") or field.get("name")
+        field_id = field.get("id")
+        if not field_id or not isinstance(field_label, str):
+            continue
+        label_to_id.setdefault(field_label.lower(), int(field_id))
+
+    telegram = []
+    for label, field_id in label_to_id.items():
+        is_link = _is_telegram_link_label(label)
+        is_id = "telegram" in label and "id" in label
+        if is_link or is_id:
+            telegram.append((field_id, is_link, is_id))
+    return TemplateFieldRoles(
+        city=label_to_id.get("город"),
+        gender=label_to_id.get("пол"),
+        telegram=tuple(telegram),
+    )
+
+
+def build_contact_payload(
+    data: ContactData,
+    *,
+    template: dict,
+    template_id: int,
+) -> Dict[str, Any]:
+    """Build the Planfix contact request body as a plain dict.
+
+    Mirrors ``PlanfixContactPayload(...).model_dump(mode="json", exclude_none=True)``
+    without running pydantic validation on trusted internal data.
+    """
+
+    custom_fields: list[Dict[str, Any]] = []
+
+    roles = template.get(TEMPLATE_FIELD_INDEX_KEY)
+    if roles is None:
+        roles = index_template_fields(template)
+
+    if roles.city is not None and data.city:
+        custom_fields.append({"field": {"id": roles.city}, "value": data.city})
+    if roles.gender is not None and data.gender:
+        custom_fields.append(
+            {
+                "field": {"id": roles.gender},
+                "value": _GENDER_MAP.get(data.gender, data.gender),
+            }
         )
 
+    telegram_id = str(data.telegram_id) if data.telegram_id is not None else None
+    telegram_link: str | None = None
+    if data.telegram_username:
+        telegram_link = f"https://t.me/{data.telegram_username.lstrip('@')}"
+
+    if telegram_link or data.telegram_id:
+        for field_id, is_link, is_id in roles.telegram:
+            if telegram_link and is_link:
+                custom_fields.append({"field": {"id": field_id}, "value": telegram_link})
+            if data.telegram_id and is_id:
+                custom_fields.append({"field": {"id": field_id}, "value": telegram_id})
+
+    phones = [{"number": data.phone, "type": 1}]
+
+    birth_date = {
+        "date": data.birthdate.strftime("%d-%m-%Y"),
+    }
+
+    payload: Dict[str, Any] = {
+        "template": {"id": template_id},
+        "lastname": data.last_name,
+        "name": data.first_name,
+        "midname": data.patronymic or "",
+        "gender": _GENDER_MAP.get(data.gender, data.gender),
+        "address": data.city,
+        "birthDate": birth_date,
+        "phones": phones,
+        "customFieldData": custom_fields or None,
+        "isCompany": False,
+        "isDeleted": False,
+        "sourceObjectId": telegram_id,
+        "telegram": telegram_link,
+        "telegramId": telegram_id,
+    }
+    return {key: value for key, value in payload.items() if value is not None}
@@ -3,17 +3,52 @@
 from __future__ import annotations
 
 import asyncio
-from typing import Any, Dict, Optional
-
+import os
+import random
+import time
+from dataclasses import dataclass
+from pathlib import Path
+from typing import Any, AsyncIterator, Callable, Dict, Optional
+
+import aiofiles
+import aiofiles.os
 import httpx
-from tenacity import AsyncRetrying, RetryError, retry_if_exception_type, stop_after_attempt, wait_exponential
+import orjson
+
+try:
+    import ijson
+except ImportError:  # optional: fall back to buffering the whole template list
+    ijson = None
 
 from bot.logging import get_logger
-from bot.schemas import ContactData, PlanfixContactPayload
+from bot.schemas import (
+    TEMPLATE_FIELD_INDEX_KEY,
+    ContactData,
+    build_contact_payload,
+    index_template_fields,
+)
 
 
 logger = get_logger(__name__)
 
+JSON_HEADERS = {"Content-Type": "application/json"}
+
+UPLOAD_CHUNK_SIZE = 64 * 1024
+# Escapes for form-data header parameters, as httpx applies them to its own multipart
+_FORM_PARAM_ESCAPES = str.maketrans({'"': "%22", "\\": "\\\\", "\r": "%0D", "\n": "%0A"})
+
+
+def _form_part_header(boundary: str, name: str, filename: Optional[str] = None) -> bytes:
+    """Boundary line and headers opening one multipart/form-data part."""
+    disposition = f'form-data; name="{name.translate(_FORM_PARAM_ESCAPES)}"'
+    if filename is None:
+        return f"--{boundary}\r\nContent-Disposition: {disposition}\r\n\r\n".encode()
+    disposition += f'; filename="{filename.translate(_FORM_PARAM_ESCAPES)}"'
+    return (
+        f"--{boundary}\r\nContent-Disposition: {disposition}\r\n"
+        "Content-Type: application/octet-stream\r\n\r\n"
+    ).encode()
+
 
 class PlanfixError(Exception):
     """Base exception for Planfix errors."""
@@ -32,6 +67,62 @@ class PlanfixError(Exception):
         return False
 
 
+class PlanfixClientError(PlanfixError):
+    """4xx response: the request itself is wrong, so retrying cannot help."""
+
+
+class PlanfixServerError(PlanfixError):
+    """5xx response: a transient Planfix failure worth retrying."""
+
+
+@dataclass(frozen=True, slots=True)
+class RetryPolicy:
+    """How PlanfixClient retries failed requests; built once and shared by all calls."""
+
+    max_attempts: int = 3
+    backoff_max: float = 8.0
+    retry_on: tuple[type[BaseException], ...] = (httpx.RequestError, PlanfixServerError)
+
+    def delay(self, attempt: int) -> float:
+        """Full-jitter backoff after ``attempt`` failed tries: up to 1s, 2s, 4s ... capped.
+
+        The random spread keeps concurrent callers from retrying in lockstep.
+        """
+        return random.uniform(0, min(self.backoff_max, 2 ** (attempt - 1)))
+
+
+DEFAULT_RETRY_POLICY = RetryPolicy()
+
+
+def _raise_for_status(response: httpx.Response, endpoint: str) -> None:
+    """Raise PlanfixServerError for 5xx and PlanfixClientError for 4xx responses."""
+    status = response.status_code
+    if status < 400:
+        return
+    if status >= 500:
+        logger.warning("planfix_request_retry", status=status, endpoint=endpoint, body=response.text)
+        raise PlanfixServerError("Server error", status_code=status, body=response.text)
+    logger.error("planfix_request_failed", status=status, body=response.text, endpoint=endpoint)
+    raise PlanfixClientError(f"Planfix API error: {status}", status_code=status, body=response.text)
+
+
+class _AsyncByteReader:
+    """Async file-like wrapper that lets ijson read an httpx byte stream."""
+
+    def __init__(self, chunks: AsyncIterator[bytes]) -> None:
+        self._chunks = chunks
+
+    async def read(self, size: int = -1) -> bytes:
+        if size == 0:
+            # ijson probes with read(0) to detect bytes vs str
+            return b""
+        # An empty read means EOF to ijson, so skip empty chunks
+        async for chunk in self._chunks:
+            if chunk:
+                return chunk
+        return b""
+
+
 class PlanfixClient:
     """HTTP client for Planfix operations."""
 
@@ -41,15 +132,43 @@ class PlanfixClient:
         token: str,
         template_id: int,
         timeout: float = 10.0,
+        template_ttl: float = 600.0,
+        pool_size: int = 20,
+        retry_policy: RetryPolicy = DEFAULT_RETRY_POLICY,
     ) -> None:
-        self._base_url = base_url.rstrip("/") + "/"
+        self._base_url = base_url if base_url.endswith("/") else base_url + "/"
         self._token = token
         self._template_id = template_id
         self._timeout = timeout
-        self._client = httpx.AsyncClient(base_url=self._base_url, timeout=timeout)
+        self._pool_size = pool_size
+        self._retry_policy = retry_policy
+        # Created on first request so the pool binds to the running event loop
+        self._client: httpx.AsyncClient | None = None
+        # Contact template rarely changes; keep it for template_ttl seconds
+        self._template_ttl = template_ttl
+        self._template_cache: tuple[float, Dict[str, Any]] | None = None
+        self._template_lock = asyncio.Lock()
+
+    def _http(self) -> httpx.AsyncClient:
+        if self._client is None:
+            self._client = httpx.AsyncClient(
+                base_url=self._base_url,
+                timeout=self._timeout,
+                headers={"Authorization": f"Bearer {self._token}"},
+                http2=True,
+                # Keep every pooled connection alive so concurrent callers never re-handshake
+                limits=httpx.Limits(
+                    max_connections=self._pool_size,
+                    max_keepalive_connections=self._pool_size,
+                    keepalive_expiry=60,
+                ),
+            )
+        return self._client
 
     async def close(self) -> None:
-        await self._client.aclose()
+        if self._client is not None:
+            await self._client.aclose()
+            self._client = None
 
     async def _request(
         self,
@@ -58,70 +177,106 @@ class PlanfixClient:
         *,
         json: Optional[Dict[str, Any]] = None,
         params: Optional[Dict[str, Any]] = None,
-        data: Optional[Dict[str, Any]] = None,
+        body: Optional[Callable[[], AsyncIterator[bytes]]] = None,
+        headers: Optional[Dict[str, str]] = None,
     ) -> Dict[str, Any]:
-        headers = {"Authorization": f"Bearer {self._token}"}
-
-        async for attempt in AsyncRetrying(
-            stop=stop_after_attempt(3),
-            wait=wait_exponential(multiplier=1, min=1, max=8),
-            retry=retry_if_exception_type((httpx.RequestError, PlanfixError)),
-            reraise=True,
-        ):
-            with attempt:
-                response = await self._client.request(
+        # Serialize once with orjson instead of letting httpx json.dumps on every attempt
+        content: Optional[bytes] = None
+        if json is not None:
+            content = orjson.dumps(json)
+            headers = JSON_HEADERS
+
+        policy = self._retry_policy
+        attempt = 0
+        while True:
+            attempt += 1
+            try:
+                response = await self._http().request(
                     method=method,
                     url=endpoint,
-                    json=json,
+                    # A streamed body is consumed by each attempt, so start a fresh one
+                    content=body() if body is not None else content,
                     params=params,
-                    data=data,
                     headers=headers,
                 )
-
-                if response.status_code >= 500:
-                    logger.warning(
-                        "planfix_request_retry",
-                        status=response.status_code,
-                        endpoint=endpoint,
-                        body=response.text,
-                    )
-                    raise PlanfixError("Server error", status_code=response.status_code, body=response.text)
-
-                if response.status_code >= 400:
-                    error_body = response.text
-                    logger.error(
-                        "planfix_request_failed",
-                        status=response.status_code,
-                        body=error_body,
-                        endpoint=endpoint,
-                    )
-                    raise PlanfixError(
-                        f"Planfix API error: {response.status_code}",
-                        status_code=response.status_code,
-                        body=error_body,
-                    )
-
-                return response.json()
-
-        raise RetryError("Unreachable")
+                _raise_for_status(response, endpoint)
+                return orjson.loads(response.content)
+            except policy.retry_on:
+                if attempt >= policy.max_attempts:
+                    raise
+                await asyncio.sleep(policy.delay(attempt))
+
+    def _cached_template(self) -> Optional[Dict[str, Any]]:
+        cached = self._template_cache
+        if cached is not None and time.monotonic() - cached[0] < self._template_ttl:
+            return cached[1]
+        return None
+
+    def invalidate_template(self) -> None:
+        """Drop cached contact template so the next call refetches it."""
+        self._template_cache = None
 
     async def get_contact_template(self) -> Dict[str, Any]:
-        logger.info("planfix_template_fetch", template_id=self._template_id)
+        template = self._cached_template()
+        if template is not None:
+            return template
+
+        async with self._template_lock:
+            # Another coroutine may have filled the cache while we waited
+            template = self._cached_template()
+            if template is not None:
+                return template
+
+            logger.info("planfix_template_fetch", template_id=self._template_id)
+            template = await self._find_contact_template()
+            if template is None:
+                raise PlanfixError(f"Template {self._template_id} not found")
+            template[TEMPLATE_FIELD_INDEX_KEY] = index_template_fields(template)
+            self._template_cache = (time.monotonic(), template)
+            return template
+
+    async def _find_contact_template(self) -> Optional[Dict[str, Any]]:
+        if ijson is not None:
+            try:
+                return await self._stream_contact_template()
+            except (httpx.TransportError, PlanfixServerError, ijson.JSONError) as exc:
+                # Transient or parse failure: fall through to the buffered request, which
+                # retries. A 4xx (PlanfixClientError) would only fail the same way again.
+                logger.warning("planfix_template_stream_failed", error=str(exc))
+
         response = await self._request(
             "GET",
             "contact/templates",
         )
-        templates = response.get("templates", [])
-        for template in templates:
-            if int(template.get("id")) == int(self._template_id):
-                return template
-        raise PlanfixError(f"Template {self._template_id} not found")
+        template_id = int(self._template_id)
+        return next(
+            (t for t in response.get("templates", []) if int(t.get("id")) == template_id),
+            None,
+        )
 
-    async def list_contacts_by_phone(self, phone: str) -> list[dict[str, Any]]:
+    async def _stream_contact_template(self) -> Optional[Dict[str, Any]]:
+        """Parse contact/templates incrementally and stop at the configured template."""
+        async with self._http().stream("GET", "contact/templates") as response:
+            if response.status_code >= 400:
+                await response.aread()
+                _raise_for_status(response, "contact/templates")
+            template_id = int(self._template_id)
+            reader = _AsyncByteReader(response.aiter_bytes())
+            async for template in ijson.items_async(reader, "templates.item", use_float=True):
+                if int(template.get("id")) == template_id:
+                    return template
+        return None
+
+    async def list_contacts_by_phone(self, phone: str, *, page_size: int = 1) -> list[dict[str, Any]]:
+        """Search contacts by phone.
+
+        Callers only look at the first match, so by default a single record
+        is requested.
+        """
         logger.info("planfix_contact_search", phone=phone)
         payload = {
             "offset": 0,
-            "pageSize": 100,
+            "pageSize": page_size,
             "fields": "id,name,midname,lastname,phones",
             "filters": [
                 {
@@ -138,8 +293,7 @@ class PlanfixClient:
         )
         return response.get("contacts", [])
 
-    async def create_contact(self, contact: PlanfixContactPayload) -> Dict[str, Any]:
-        payload = contact.model_dump(mode="json", exclude_none=True)
+    async def create_contact(self, payload: Dict[str, Any]) -> Dict[str, Any]:
         logger.info("planfix_contact_create", template_id=self._template_id)
         response = await self._request(
             "POST",
@@ -148,8 +302,7 @@ class PlanfixClient:
         )
         return response
 
-    async def update_contact(self, contact_id: int, contact: PlanfixContactPayload) -> Dict[str, Any]:
-        payload = contact.model_dump(mode="json", exclude_none=True)
+    async def update_contact(self, contact_id: int, payload: Dict[str, Any]) -> Dict[str, Any]:
         logger.info("planfix_contact_update", contact_id=contact_id)
         response = await self._request(
             "POST",
@@ -165,19 +318,25 @@ class PlanfixClient:
         update_existing: bool = False,
         existing_contact_id: int | None = None,
     ) -> Dict[str, Any]:
-        template = await self.get_contact_template()
-        payload = PlanfixContactPayload.from_contact_data(
+        contact_id = existing_contact_id
+        if update_existing and contact_id is None:
+            # Template and phone lookup are independent: overlap the round-trips
+            template, existing = await asyncio.gather(
+                self.get_contact_template(),
+                self.list_contacts_by_phone(data.phone),
+            )
+            if not existing:
+                raise PlanfixError("Contact not found for update")
+            contact_id = int(existing[0]["id"])
+        else:
+            template = await self.get_contact_template()
+
+        payload = build_contact_payload(
             data,
             template=template,
             template_id=self._template_id,
         )
         if update_existing:
-            contact_id = existing_contact_id
-            if contact_id is None:
-                existing = await self.list_contacts_by_phone(data.phone)
-                if not existing:
-                    raise PlanfixError("Contact not found for update")
-                contact_id = int(existing[0]["id"])
             return await self.update_contact(contact_id, payload)
         return await self.create_contact(payload)
 
@@ -247,32 +406,34 @@ class PlanfixClient:
     ) -> Dict[str, Any]:
         """Upload file to task by number."""
         logger.info("planfix_task_file_upload", task_number=task_number, file_path=file_path)
-        # Read file and upload
-        import aiofiles
-        async with aiofiles.open(file_path, "rb") as f:
-            file_content = await f.read()
-            files = {"file": (Path(file_path).name, file_content, "application/octet-stream")}
-            data: Dict[str, Any] = {}
-            if description:
-                data["description"] = description
-
-            # Use multipart/form-data for file upload
-            headers = {"Authorization": f"Bearer {self._token}"}
-            async with httpx.AsyncClient() as client:
-                response = await client.post(
-                    f"{self._base_url}task/{task_number}/files",
-                    headers=headers,
-                    files=files,
-                    data=data,
-                    timeout=self._timeout,
-                )
-                if response.status_code >= 400:
-                    raise PlanfixError(
-                        f"File upload failed: {response.status_code}",
-                        status_code=response.status_code,
-                        body=response.text,
-                    )
-                return response.json()
+        data: Dict[str, Any] = {}
+        if description:
+            data["description"] = description
+
+        # Multipart/form-data goes through the shared client, so uploads reuse its
+        # pooled connection and the same retry policy as other calls. The file is read
+        # with aiofiles in 64 KiB chunks, so it is never buffered whole and disk reads
+        # don't block the event loop (httpx would read a plain file handle synchronously).
+        path = Path(file_path)
+        boundary = os.urandom(16).hex()
+        head = b"".join(
+            _form_part_header(boundary, name) + str(value).encode() + b"\r\n" for name, value in data.items()
+        ) + _form_part_header(boundary, "file", path.name)
+        tail = f"\r\n--{boundary}--\r\n".encode()
+        size = (await aiofiles.os.stat(path)).st_size
+        headers = {
+            "Content-Type": f"multipart/form-data; boundary={boundary}",
+            "Content-Length": str(len(head) + size + len(tail)),
+        }
+
+        async def body() -> AsyncIterator[bytes]:
+            yield head
+            async with aiofiles.open(path, "rb") as f:
+                while chunk := await f.read(UPLOAD_CHUNK_SIZE):
+                    yield chunk
+            yield tail
+
+        return await self._request("POST", f"task/{task_number}/files", body=body, headers=headers)
 
     async def upload_file_from_url(
         self,
@@ -303,7 +464,12 @@ class PlanfixClient:
           "users": [{"id": "contact:1"}, ...],
           "groups": [...]
         }
+
+        An empty ``executor_contact_ids`` is a no-op: no request is sent and
+        the task's current assignees are left as they are.
         """
+        if not executor_contact_ids:
+            return {}
         logger.info("planfix_task_set_executors", task_number=task_number, executors=executor_contact_ids)
         # Planfix API expects assignees as object with "users" array
         # Contact IDs should be formatted as "contact:ID" or just ID as integer
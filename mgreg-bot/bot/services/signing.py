@@ -0,0 +1,18 @@
+"""HMAC-SHA256 helpers shared by WebApp link signing and webhook verification."""
+
+from __future__ import annotations
+
+import hashlib
+import hmac
+
+
+# Keyed HMAC states per secret; copying one is cheaper than re-keying
+_hmac_bases: dict[str, hmac.HMAC] = {}
+
+
+def keyed_hmac(secret: str) -> hmac.HMAC:
+    """Return a fresh HMAC-SHA256 object keyed with ``secret``, ready for ``update()``."""
+    base = _hmac_bases.get(secret)
+    if base is None:
+        base = _hmac_bases[secret] = hmac.new(secret.encode(), digestmod=hashlib.sha256)
+    return base.copy()
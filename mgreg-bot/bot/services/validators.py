@@ -3,13 +3,55 @@
 from __future__ import annotations
 
 import re
-from datetime import date, datetime
+from datetime import date
 
 from pydantic import ValidationError
 
 
-PHONE_CLEAN_PATTERN = re.compile(r"\D+")
 PHONE_VALID_PATTERN = re.compile(r"^\+?[1-9]\d{7,14}$")
+# Most input is a Russian number (+7/7/8 and ten digits) with common separators
+_RU_PHONE_PATTERN = re.compile(r"(?:\+?7|8)(\d{10})")
+_PHONE_SEPARATORS = str.maketrans("", "", " -()\t")
+
+
+# Codepoints the translate tables store up front: ASCII, Latin-1 and Cyrillic cover
+# almost all real input. Anything else is computed per lookup and not stored, so
+# arbitrary Unicode from users cannot grow the module-level tables.
+_TABLE_PREFILL = range(0x500)
+
+
+class _NonDigitTable(dict):
+    """str.translate table that deletes every non-decimal character.
+
+    Keeps the Unicode semantics of the ``\\D`` regex class it replaces.
+    """
+
+    def __init__(self) -> None:
+        super().__init__((codepoint, self.__missing__(codepoint)) for codepoint in _TABLE_PREFILL)
+
+    def __missing__(self, codepoint: int) -> int | None:
+        return codepoint if chr(codepoint).isdecimal() else None
+
+
+_NON_DIGITS = _NonDigitTable()
+
+
+class _NameCharTable(dict):
+    """str.translate table that deletes every character allowed in a name.
+
+    Allowed means the ``[\\w\\-\\s]`` regex class (Unicode letters, digits,
+    underscore, hyphen and whitespace), so a valid name translates to "".
+    """
+
+    def __init__(self) -> None:
+        super().__init__((codepoint, self.__missing__(codepoint)) for codepoint in _TABLE_PREFILL)
+
+    def __missing__(self, codepoint: int) -> int | None:
+        char = chr(codepoint)
+        return None if char.isalnum() or char.isspace() or char in "_-" else codepoint
+
+
+_NAME_CHARS = _NameCharTable()
 
 
 class ValidationException(ValueError):
@@ -26,44 +68,70 @@ def normalize_phone(raw_phone: str) -> str:
     if not raw_phone:
         raise ValidationException("Пожалуйста, укажи номер телефона.")
 
-    digits = PHONE_CLEAN_PATTERN.sub("", raw_phone)
+    match = _RU_PHONE_PATTERN.fullmatch(raw_phone.translate(_PHONE_SEPARATORS))
+    if match:
+        return "+7" + match.group(1)
+
+    digits = raw_phone.translate(_NON_DIGITS)
 
-    if digits.startswith("8") and len(digits) == 11:
+    if len(digits) == 11 and digits[0] == "8":
         digits = "7" + digits[1:]
 
-    if digits.startswith("7") and len(digits) == 11:
-        digits = "+" + digits
-    elif raw_phone.startswith("+"):
-        digits = "+" + digits
-    elif not digits.startswith("+"):
-        digits = "+" + digits
+    # digits holds only decimals, so every input gets exactly one leading "+"
+    normalized = "+" + digits
 
-    if not PHONE_VALID_PATTERN.fullmatch(digits):
+    if not PHONE_VALID_PATTERN.fullmatch(normalized):
         raise ValidationException(
             "Кажется, формат номера некорректен. Попробуй ещё раз, пожалуйста."
         )
 
-    return digits
+    return normalized
+
+
+def _parse_date(value: str) -> date | None:
+    """Parse D.M.YYYY or YYYY-M-D (day and month may be zero-padded) without strptime.
+
+    Returns None when the input has a different shape; raises ValueError
+    for a well-formed string that is not a valid calendar date.
+    """
+
+    if not value.isascii():
+        return None
+    parts = value.split(".")
+    if len(parts) == 3:
+        day, month, year = parts
+    else:
+        parts = value.split("-")
+        if len(parts) != 3:
+            return None
+        year, month, day = parts
+    if len(year) != 4 or not 1 <= len(month) <= 2 or not 1 <= len(day) <= 2:
+        return None
+    if not (year + month + day).isdigit():
+        return None
+    return date(int(year), int(month), int(day))
+
 
+def parse_birthdate(value: str, *, today: date | None = None) -> date:
+    """Parse birthdate ensuring reasonable age boundaries.
 
-def parse_birthdate(value: str) -> date:
-    """Parse birthdate ensuring reasonable age boundaries."""
+    ``today`` lets a caller validating several dates look up the current date once.
+    """
 
     if not value:
         raise ValidationException("Укажи, пожалуйста, дату рождения.")
 
-    for fmt in ("%d.%m.%Y", "%Y-%m-%d"):
-        try:
-            parsed = datetime.strptime(value, fmt).date()
-            break
-        except ValueError:
-            continue
-    else:  # no break
+    try:
+        parsed = _parse_date(value)
+    except ValueError:
+        parsed = None
+    if parsed is None:
         raise ValidationException(
             "Не получилось распознать дату. Используй формат ДД.ММ.ГГГГ, пожалуйста."
         )
 
-    today = date.today()
+    if today is None:
+        today = date.today()
     age = today.year - parsed.year - ((today.month, today.day) < (parsed.month, parsed.day))
 
     if age < 10 or age > 120:
@@ -77,13 +145,13 @@ def parse_birthdate(value: str) -> date:
 def validate_name(value: str, field_label: str) -> str:
     """Validate name-like fields for minimum length and characters."""
 
-    if not value or len(value.strip()) < 2:
+    sanitized = value.strip() if value else ""
+    if len(sanitized) < 2:
         raise ValidationException(
             f"{field_label} должно содержать хотя бы два символа. Попробуй ещё раз."
         )
 
-    sanitized = value.strip()
-    if not re.fullmatch(r"[\w\-\sЁёА-Яа-я]+", sanitized):
+    if sanitized.translate(_NAME_CHARS):
         raise ValidationException(
             f"{field_label} содержит недопустимые символы. Попробуй снова, пожалуйста."
         )
@@ -94,10 +162,11 @@ def validate_name(value: str, field_label: str) -> str:
 def validate_city(value: str) -> str:
     """Validate city input."""
 
-    if not value or len(value.strip()) < 2:
+    city = value.strip() if value else ""
+    if len(city) < 2:
         raise ValidationException(
             "Напиши, пожалуйста, название города — хотя бы два символа."
         )
 
-    return value.strip()
+    return city
 
@@ -2,19 +2,30 @@
 
 from __future__ import annotations
 
-import hashlib
 import hmac
 import json
-from datetime import datetime
+from datetime import date, datetime
+from functools import lru_cache
 from typing import Any, Dict, Optional
 from uuid import uuid4
 
 
+@lru_cache(maxsize=4096)
 def normalize_planfix_date(date_str: str) -> str:
     """Convert Planfix date format (DD-MM-YYYY) to ISO format (YYYY-MM-DD)."""
     if not date_str:
         return ""
-    
+
+    # Planfix sends zero-padded DD-MM-YYYY / DD.MM.YYYY; rearrange those by slicing
+    if len(date_str) == 10 and date_str[2] in "-." and date_str[5] == date_str[2]:
+        day, month, year = date_str[:2], date_str[3:5], date_str[6:]
+        if (day + month + year).isdigit() and date_str.isascii():
+            try:
+                date(int(year), int(month), int(day))
+            except ValueError:
+                return date_str
+            return f"{year}-{month}-{day}"
+
     # Try to parse DD-MM-YYYY format
     try:
         dt = datetime.strptime(date_str, "%d-%m-%Y")
@@ -39,17 +50,21 @@ def normalize_planfix_date(date_str: str) -> str:
     # Return as-is if can't parse
     return date_str
 
+import orjson
+from aiogram.types import Update
 from fastapi import FastAPI, Header, HTTPException, Request, Response, Security
 from fastapi.responses import HTMLResponse, JSONResponse, RedirectResponse
 from fastapi.security import HTTPBasic, HTTPBasicCredentials
+from pydantic import ValidationError
 
 from bot.config import get_settings
 from bot.database import get_database
 from bot.logging import get_logger
+from bot.schemas import webapp_form_for_task
 from bot.services.planfix import PlanfixClient, PlanfixError
+from bot.services.signing import keyed_hmac
 
 logger = get_logger(__name__)
-settings = get_settings()
 app = FastAPI(title="Planfix-Telegram Bot Webhooks")
 
 # Middleware for request logging
@@ -85,10 +100,12 @@ security = HTTPBasic()
 # Global instances (will be initialized in startup)
 planfix_client: Optional[PlanfixClient] = None
 bot_instance: Optional[Any] = None  # Telegram Bot instance
+dispatcher_instance: Optional[Any] = None  # aiogram Dispatcher, set only in Telegram webhook mode
 
 
 def verify_planfix_basic_auth(credentials: HTTPBasicCredentials) -> bool:
     """Verify Planfix webhook Basic Auth credentials."""
+    settings = get_settings()
     if not settings.planfix_webhook_login or not settings.planfix_webhook_password:
         return True  # Skip verification if credentials not set
     return (
@@ -111,19 +128,7 @@ async def get_task_nomber_from_db(task_id: int | str) -> str | None:
     
     Returns nomber if found, None otherwise.
     """
-    db = get_database()
-    task_row = await db.fetch_one(
-        "SELECT nomber FROM tasks WHERE task_id = ?",
-        (task_id,),
-    )
-    if task_row:
-        try:
-            nomber = task_row["nomber"]
-            if nomber:
-                return str(nomber)
-        except (KeyError, TypeError):
-            pass
-    return None
+    return await get_database().get_task_nomber(task_id)
 
 
 async def get_task_nomber_for_api(task_id: int | str, webhook_data: Dict[str, Any] | None = None) -> str:
@@ -159,6 +164,7 @@ def verify_yforms_signature(body: bytes, signature: Optional[str]) -> bool:
     If YFORMS_WEBHOOK_SECRET is not set, verification is skipped (returns True).
     This allows working with Yandex Forms which don't support HMAC signature calculation.
     """
+    settings = get_settings()
     # Skip verification if secret is not configured
     if not settings.yforms_webhook_secret:
         return True
@@ -167,12 +173,9 @@ def verify_yforms_signature(body: bytes, signature: Optional[str]) -> bool:
     if not signature:
         return False
     
-    expected = hmac.new(
-        settings.yforms_webhook_secret.encode(),
-        body,
-        hashlib.sha256,
-    ).hexdigest()
-    return hmac.compare_digest(expected, signature)
+    mac = keyed_hmac(settings.yforms_webhook_secret)
+    mac.update(body)
+    return hmac.compare_digest(mac.hexdigest(), signature)
 
 
 def generate_webapp_signature(params: Dict[str, str], secret: str) -> str:
@@ -180,11 +183,9 @@ def generate_webapp_signature(params: Dict[str, str], secret: str) -> str:
     # Sort params and create query string
     sorted_params = sorted(params.items())
     query_string = "&".join(f"{k}={v}" for k, v in sorted_params)
-    return hmac.new(
-        secret.encode(),
-        query_string.encode(),
-        hashlib.sha256,
-    ).hexdigest()
+    mac = keyed_hmac(secret)
+    mac.update(query_string.encode())
+    return mac.hexdigest()
 
 
 def verify_webapp_signature(params: Dict[str, str], signature: str, secret: str) -> bool:
@@ -214,14 +215,16 @@ def _parse_yforms_result(result_raw: Any) -> Dict[str, Any]:
 async def startup() -> None:
     """Initialize services on startup (fallback if lifespan is not used)."""
     global planfix_client
+    settings = get_settings()
     if planfix_client is None:
         # Only initialize if not already set via set_planfix_client()
         db = get_database(settings.database_path)
         await db.init()
         planfix_client = PlanfixClient(
-            base_url=str(settings.planfix_base_url),
+            base_url=settings.planfix_base_url_str,
             token=settings.planfix_token,
             template_id=settings.planfix_template_id,
+            pool_size=settings.planfix_pool_size,
         )
     logger.info("webhook_server_started")
 
@@ -245,6 +248,36 @@ async def health() -> Dict[str, str]:
     return {"status": "ok", "service": "crmbot-webhook-server"}
 
 
+@app.post("/webhooks/telegram")
+async def telegram_webhook(
+    request: Request,
+    x_telegram_bot_api_secret_token: Optional[str] = Header(default=None),
+) -> Response:
+    """Feed a Telegram update into the bot dispatcher (Telegram webhook mode)."""
+    settings = get_settings()
+    if dispatcher_instance is None or bot_instance is None:
+        raise HTTPException(status_code=404, detail="Telegram webhook mode is disabled")
+
+    # The secret is required in webhook mode (run_webhook refuses to start without it)
+    secret = settings.telegram_webhook_secret
+    if not secret or not hmac.compare_digest(x_telegram_bot_api_secret_token or "", secret):
+        logger.warning("telegram_webhook_invalid_secret")
+        raise HTTPException(status_code=401, detail="Invalid secret token")
+
+    try:
+        update = Update.model_validate_json(await request.body(), context={"bot": bot_instance})
+    except ValidationError as e:
+        logger.warning("telegram_webhook_invalid_update", error=str(e))
+        raise HTTPException(status_code=400, detail="Invalid update")
+    try:
+        await dispatcher_instance.feed_update(bot_instance, update)
+    except Exception as e:
+        # Telegram redelivers updates answered with an error, which would repeat the
+        # handler's side effects (assignment, Planfix writes); acknowledge it instead
+        logger.error("telegram_update_failed", update_id=update.update_id, error=str(e))
+    return Response(status_code=200)
+
+
 @app.get("/webhooks/planfix-guest")
 async def planfix_webhook_get() -> Dict[str, str]:
     """Health check for Planfix webhook endpoint."""
@@ -277,7 +310,7 @@ async def planfix_webhook(
 
     try:
         try:
-            data = json.loads(body)
+            data = orjson.loads(body)
         except json.JSONDecodeError as je:
             body_str = body.decode("utf-8", errors="replace")
             data = None
@@ -285,7 +318,7 @@ async def planfix_webhook(
             fixed = body_str.rstrip()
             if fixed.endswith("}") and fixed.count("{") > fixed.count("}"):
                 try:
-                    data = json.loads(fixed + "}")
+                    data = orjson.loads(fixed + "}")
                     logger.info("planfix_webhook_json_fixed_truncated")
                 except json.JSONDecodeError:
                     pass
@@ -346,6 +379,7 @@ async def handle_task_created(data: Dict[str, Any]) -> None:
     Note: Planfix automation has already changed status to "В подборе гостя".
     Bot should only send invitations and schedule deadline check.
     """
+    settings = get_settings()
     logger.info("handle_task_created_started", data_keys=list(data.keys()) if isinstance(data, dict) else None)
     
     # Extract nomber (task number) from webhook - this is used for API calls
@@ -389,6 +423,8 @@ async def handle_task_created(data: Dict[str, Any]) -> None:
         restaurant = data.get("restaurant", {}) or data.get("task", {}).get("restaurant", {})
         restaurant_name = restaurant.get("name") or task_details.get("name", "")
         restaurant_address = restaurant.get("address", "")
+        # WebApp form is picked from the task name once, so accepts don't refetch the task
+        form_type = webapp_form_for_task(task_details.get("name"))
         
         # Support visit data from different locations
         visit = data.get("visit", {}) or data.get("task", {}).get("visit", {})
@@ -426,6 +462,7 @@ async def handle_task_created(data: Dict[str, Any]) -> None:
         restaurant = data.get("restaurant", {})
         restaurant_name = restaurant.get("name", "")
         restaurant_address = restaurant.get("address", "")
+        form_type = None
         visit = data.get("visit", {})
         visit_date = visit.get("date") or data.get("visitDate", "")
         deadline = visit.get("deadline") or data.get("deadline", "")
@@ -468,11 +505,12 @@ async def handle_task_created(data: Dict[str, Any]) -> None:
     await db.execute(
         """
         INSERT OR REPLACE INTO tasks 
-        (task_id, nomber, restaurant_name, restaurant_address, visit_date, deadline, status, created_at)
-        VALUES (?, ?, ?, ?, ?, ?, ?, ?)
+        (task_id, nomber, restaurant_name, restaurant_address, visit_date, deadline, status, form_type, created_at)
+        VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)
         """,
-        (task_id_db, nomber_db, restaurant_name, restaurant_address, visit_date, normalized_deadline, "pending", datetime.now().isoformat()),
+        (task_id_db, nomber_db, restaurant_name, restaurant_address, visit_date, normalized_deadline, "pending", form_type, datetime.now().isoformat()),
     )
+    db.forget_task(task_id_db)
 
     # Check if executor already assigned using nomber (task number)
     try:
@@ -561,11 +599,9 @@ async def handle_task_created(data: Dict[str, Any]) -> None:
             logger.error("planfix_status_guest_selection_failed", task_nomber=task_nomber, error=str(e))
 
     # Schedule deadline check
-    if deadline:
+    if normalized_deadline:
         from bot.scheduler import schedule_deadline_check
-        normalized_deadline = normalize_planfix_date(deadline)
-        if normalized_deadline:
-            await schedule_deadline_check(task_id_db, normalized_deadline, planfix_client)
+        await schedule_deadline_check(task_id_db, normalized_deadline)
 
     # Log in Planfix using nomber (task number)
     try:
@@ -600,7 +636,7 @@ async def handle_task_assignee_manual(data: Dict[str, Any]) -> None:
     await db.execute(
         """
         UPDATE tasks 
-        SET assigned_guest_id = ?, status = 'assigned'
+        SET assigned_guest_id = ?, status = 'assigned', executor_confirmed_at = CURRENT_TIMESTAMP
         WHERE task_id = ?
         """,
         (guest_id, task_id),
@@ -655,11 +691,9 @@ async def handle_task_wait_form(data: Dict[str, Any]) -> None:
     )
     
     # Schedule deadline check if not already scheduled
-    if deadline:
+    if normalized_deadline:
         from bot.scheduler import schedule_deadline_check
-        normalized_deadline = normalize_planfix_date(deadline)
-        if normalized_deadline:
-            await schedule_deadline_check(int(task_id), normalized_deadline, planfix_client)
+        await schedule_deadline_check(int(task_id), normalized_deadline)
     
     # Optional: Add informational comment (automation may not add comment)
     # Use nomber (task number) for API call
@@ -679,6 +713,7 @@ async def handle_task_deadline_failed(data: Dict[str, Any]) -> None:
     Note: Planfix automation has already changed status to "Отменена по дедлайну" and added comment.
     Bot should only update local database and notify admin.
     """
+    settings = get_settings()
     task_id = data.get("taskId") or data.get("task", {}).get("id")
     guest = data.get("guest", {})
     # Support planfixContactId (from Planfix webhook) and id (backward compatibility)
@@ -725,6 +760,7 @@ async def handle_task_cancelled_manual(data: Dict[str, Any]) -> None:
     Optional comment with reason may be added by automation if "Причина отмены" field is used.
     Bot should only update local database and notify admin.
     """
+    settings = get_settings()
     task_id = data.get("taskId") or data.get("task", {}).get("id")
     guest = data.get("guest", {})
     # Support planfixContactId (from Planfix webhook) and id (backward compatibility)
@@ -773,6 +809,7 @@ async def handle_task_completed_compensation(data: Dict[str, Any]) -> None:
     Note: Planfix automation has already changed status to "Завершена (к компенсации)".
     Bot: updates DB, adds comment, notifies admin, sends guest success + payment amount.
     """
+    settings = get_settings()
     task_id = data.get("taskId") or data.get("task", {}).get("id")
     guest = data.get("guest", {})
     # Support planfixContactId (from Planfix webhook) and id (backward compatibility)
@@ -941,11 +978,9 @@ async def handle_task_deadline_updated(data: Dict[str, Any]) -> None:
     )
     
     # Reschedule deadline check
-    if deadline:
+    if normalized_deadline:
         from bot.scheduler import schedule_deadline_check
-        normalized_deadline = normalize_planfix_date(deadline)
-        if normalized_deadline:
-            await schedule_deadline_check(int(task_id), normalized_deadline, planfix_client)
+        await schedule_deadline_check(int(task_id), normalized_deadline)
     
     # Note: Deadline is already updated in Planfix by automation
     # Bot only updates local database and reschedules deadline check
@@ -970,6 +1005,7 @@ async def handle_task_updated(data: Dict[str, Any]) -> None:
     When status is 117: send to guest notification about payment amount from finance.budget/actual or field 132.
     Prefers webhook data (task.statusId, guest.planfixContactId, finance.budget/actual) over API fetch.
     """
+    settings = get_settings()
     task_nomber = get_task_number_from_webhook(data)
     if not task_nomber:
         logger.warning("planfix_task_updated_missing_nomber")
@@ -1133,6 +1169,7 @@ async def send_invitations(
     reward_amount: str | int | float | None = None,
 ) -> None:
     """Send invitation messages to guests."""
+    settings = get_settings()
     if not bot_instance:
         logger.error("bot_instance_not_available")
         return
@@ -1222,6 +1259,7 @@ async def webapp_start(
     ts: Optional[str] = None,
 ) -> HTMLResponse:
     """WebApp start page with form redirect."""
+    settings = get_settings()
     # Verify signature
     params = {"taskId": str(taskId), "guestId": str(guestId), "form": form}
     if ts:
@@ -1354,7 +1392,7 @@ async def yforms_webhook(
         raise HTTPException(status_code=401, detail="Invalid signature")
 
     try:
-        data = json.loads(body)
+        data = orjson.loads(body)
         
         # Handle JSON-RPC 2.0 format from Yandex Forms
         if data.get("jsonrpc") == "2.0":
@@ -1471,7 +1509,7 @@ async def yforms_webhook(
         logger.error("yforms_webhook_error", error=str(e), exc_info=True)
         # Try to return JSON-RPC 2.0 error if request was JSON-RPC
         try:
-            parsed_data = json.loads(body)
+            parsed_data = orjson.loads(body)
             if isinstance(parsed_data, dict) and parsed_data.get("jsonrpc") == "2.0":
                 response_id = parsed_data.get("id")
                 if response_id is not None and not isinstance(response_id, str):
@@ -1500,6 +1538,7 @@ async def handle_form_submission(
     response_link: Optional[str] = None,
 ) -> None:
     """Handle form submission."""
+    settings = get_settings()
     db = get_database()
 
     # Check if already processed (idempotency)
@@ -1513,7 +1552,7 @@ async def handle_form_submission(
 
     score = result.get("score")
     summary = result.get("summary", "")
-    payload_json = json.dumps(result.get("raw", {}))
+    payload_json = orjson.dumps(result.get("raw", {})).decode()
 
     # Update session
     await db.execute(
@@ -1664,8 +1703,19 @@ def set_bot_instance(bot: Any) -> None:
     bot_instance = bot
 
 
+def set_dispatcher(dispatcher: Any) -> None:
+    """Set aiogram Dispatcher that receives Telegram webhook updates."""
+    global dispatcher_instance
+    dispatcher_instance = dispatcher
+
+
 def set_planfix_client(client: PlanfixClient) -> None:
     """Set Planfix client instance for webhook handlers."""
     global planfix_client
     planfix_client = client
 
+
+def get_planfix_client() -> Optional[PlanfixClient]:
+    """Return the Planfix client used by webhook handlers, if set."""
+    return planfix_client
+
@@ -0,0 +1,60 @@
+import asyncio
+from types import SimpleNamespace
+
+import pytest
+
+from bot import database
+from bot.services.planfix import PlanfixError
+
+
+@pytest.fixture
+def db(tmp_path):
+    """Fresh SQLite database installed as the process-wide ``get_database()`` instance.
+
+    Tests ``await db.init()`` themselves: the pinned pytest-asyncio cannot run
+    async fixtures under this pytest.
+    """
+    instance = database.Database(str(tmp_path / "bot.db"))
+    database._db = instance
+    yield instance
+    database._db = None
+    asyncio.run(instance.close())
+
+
+@pytest.fixture
+def counting_transaction(db, monkeypatch):
+    """Count ``db.transaction()`` calls, to check that a batch of writes commits once."""
+    counter = SimpleNamespace(count=0)
+    real_transaction = db.transaction
+
+    def transaction():
+        counter.count += 1
+        return real_transaction()
+
+    monkeypatch.setattr(db, "transaction", transaction)
+    return counter
+
+
+class FakePlanfix:
+    """Records Planfix calls; ``assigned`` maps task numbers to their current assignees
+    and assigning executors to a task number in ``failing`` raises a server error."""
+
+    def __init__(self, assigned: dict[str, list[str]] | None = None, failing: tuple[str, ...] = ()) -> None:
+        self.assigned = assigned or {}
+        self.failing = failing
+        self.calls = []
+
+    async def get_task(self, task_number, fields=None):
+        self.calls.append(("get_task", task_number))
+        return {"assignees": {"users": [{"id": uid} for uid in self.assigned.get(task_number, [])]}}
+
+    async def set_task_executors(self, task_number, contact_ids):
+        self.calls.append(("set_task_executors", task_number, contact_ids))
+        if task_number in self.failing:
+            raise PlanfixError("server error", status_code=500, body="error")
+
+    async def add_task_comment(self, task_number, text):
+        self.calls.append(("add_task_comment", task_number))
+
+    async def update_task(self, task_number, **kwargs):
+        self.calls.append(("update_task", task_number))
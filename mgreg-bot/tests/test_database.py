@@ -0,0 +1,12 @@
+async def test_forget_task_drops_refs_cached_under_either_id_form(db):
+    await db.init()
+    await db.execute(
+        "INSERT INTO tasks (task_id, nomber, restaurant_name, deadline) VALUES (123, '7', 'r', '')"
+    )
+    assert await db.get_task_refs("123") == ("7", None)
+
+    await db.execute("UPDATE tasks SET nomber = '8', form_type = 'resto_b' WHERE task_id = 123")
+    db.forget_task(123)
+
+    assert await db.get_task_refs("123") == ("8", "resto_b")
+    assert await db.get_task_refs(123) == ("8", "resto_b")
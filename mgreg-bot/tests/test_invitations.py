@@ -0,0 +1,150 @@
+import asyncio
+from types import SimpleNamespace
+
+from bot.handlers.invitations import (
+    ACCEPT_PREFIX,
+    DECLINE_PREFIX,
+    _accept_locks,
+    _parse_task_id,
+    accept_lock,
+    handle_accept,
+    router,
+)
+from tests.conftest import FakePlanfix
+
+
+def test_callback_handlers_registered_once():
+    # One accept and one decline handler; a duplicated module would double both
+    assert len(router.callback_query.handlers) == 2
+
+
+def test_parse_task_id():
+    assert _parse_task_id("accept|42", ACCEPT_PREFIX) == 42
+    assert _parse_task_id("decline|7", DECLINE_PREFIX) == 7
+    assert _parse_task_id("accept|", ACCEPT_PREFIX) is None
+    assert _parse_task_id("accept|x1", ACCEPT_PREFIX) is None
+    assert _parse_task_id("decline|7", ACCEPT_PREFIX) is None
+    assert _parse_task_id(None, ACCEPT_PREFIX) is None
+
+
+async def test_accept_lock_serializes_and_drops_idle_entries():
+    order = []
+
+    async def accept(name):
+        async with accept_lock(42):
+            order.append(f"{name} in")
+            await asyncio.sleep(0)
+            order.append(f"{name} out")
+
+    await asyncio.gather(accept("a"), accept("b"), accept("c"))
+
+    assert order == ["a in", "a out", "b in", "b out", "c in", "c out"]
+    assert _accept_locks == {}
+
+
+def _accept_callback(task_id: int, telegram_id: int, answers: list[str], bot=None):
+    async def answer(text=None, **kwargs):
+        if text:
+            answers.append(text)
+        return SimpleNamespace(chat=SimpleNamespace(id=telegram_id), message_id=900)
+
+    async def noop(*args, **kwargs):
+        return None
+
+    message = SimpleNamespace(
+        chat=SimpleNamespace(id=telegram_id),
+        message_id=100,
+        answer=answer,
+        edit_reply_markup=noop,
+    )
+    return SimpleNamespace(
+        data=f"{ACCEPT_PREFIX}{task_id}",
+        from_user=SimpleNamespace(id=telegram_id),
+        message=message,
+        answer=noop,
+        bot=bot,
+    )
+
+
+async def test_accept_retry_after_assignment_error_reaches_planfix(db):
+    await db.init()
+    await db.execute(
+        "INSERT INTO tasks (task_id, nomber, restaurant_name, deadline) VALUES (1, '11', 'r', '2030-01-01')"
+    )
+    await db.execute("INSERT INTO guest_telegram_map (planfix_contact_id, telegram_id) VALUES (10, 555)")
+    bot_data = {"settings": SimpleNamespace(guest_field_id=None, assignment_source_field_id=None)}
+
+    # First accept: Planfix rejects the assignment, the task stays reserved for the guest
+    answers: list[str] = []
+    failing = FakePlanfix(failing=("11",))
+    await handle_accept(_accept_callback(1, 555, answers), bot_data, planfix_client=failing)
+    row = await db.fetch_one("SELECT assigned_guest_id, executor_confirmed_at FROM tasks WHERE task_id = 1")
+    assert (row["assigned_guest_id"], row["executor_confirmed_at"]) == (10, None)
+    assert "Попробуй позже" in answers[-1]
+
+    # The same guest retries: the reservation must not be mistaken for another guest
+    answers.clear()
+    client = FakePlanfix()
+    await handle_accept(_accept_callback(1, 555, answers), bot_data, planfix_client=client)
+    assert ("set_task_executors", "11", [10]) in client.calls
+    assert not any("уже нашли" in text for text in answers)
+    row = await db.fetch_one("SELECT executor_confirmed_at FROM tasks WHERE task_id = 1")
+    assert row["executor_confirmed_at"] is not None
+
+
+async def test_accept_for_task_reserved_by_other_guest_is_answered_locally(db):
+    await db.init()
+    await db.execute(
+        "INSERT INTO tasks (task_id, nomber, restaurant_name, deadline, assigned_guest_id)"
+        " VALUES (1, '11', 'r', '2030-01-01', 20)"
+    )
+    await db.execute("INSERT INTO guest_telegram_map (planfix_contact_id, telegram_id) VALUES (10, 555)")
+
+    answers: list[str] = []
+    client = FakePlanfix()
+    await handle_accept(_accept_callback(1, 555, answers), {"settings": None}, planfix_client=client)
+
+    assert client.calls == []
+    assert "уже нашли" in answers[-1]
+
+
+class FakeBot:
+    def __init__(self) -> None:
+        self.deleted = []
+
+    async def delete_message(self, chat_id, message_id):
+        self.deleted.append((chat_id, message_id))
+
+
+async def test_accept_assigns_and_withdraws_other_invitations_in_one_transaction(db, counting_transaction):
+    await db.init()
+    await db.execute(
+        "INSERT INTO tasks (task_id, nomber, restaurant_name, deadline) VALUES (1, '11', 'r', '2030-01-01')"
+    )
+    await db.execute("INSERT INTO guest_telegram_map (planfix_contact_id, telegram_id) VALUES (10, 555)")
+    for guest_id, chat_id, message_id, withdrawn_at in [
+        (10, 555, 100, None),
+        (20, 777, 200, None),
+        (30, 888, 300, "2020-01-01T00:00:00"),
+    ]:
+        await db.execute(
+            "INSERT INTO invitations (task_id, guest_planfix_id, telegram_id, chat_id, message_id, withdrawn_at)"
+            " VALUES (1, ?, ?, ?, ?, ?)",
+            (guest_id, chat_id, chat_id, message_id, withdrawn_at),
+        )
+
+    bot = FakeBot()
+    client = FakePlanfix()
+    bot_data = {"settings": SimpleNamespace(guest_field_id=None, assignment_source_field_id=None)}
+    await handle_accept(_accept_callback(1, 555, [], bot=bot), bot_data, planfix_client=client)
+
+    assert counting_transaction.count == 1
+    row = await db.fetch_one("SELECT assigned_guest_id, executor_confirmed_at FROM tasks WHERE task_id = 1")
+    assert row["assigned_guest_id"] == 10
+    assert row["executor_confirmed_at"] is not None
+    rows = await db.fetch_all(
+        "SELECT chat_id, withdrawn_at IS NOT NULL AS withdrawn FROM invitations ORDER BY chat_id"
+    )
+    assert [tuple(row) for row in rows] == [(555, 0), (777, 1), (888, 1)]
+    # Only the invitation withdrawn by this accept has its message deleted
+    assert bot.deleted == [(777, 200)]
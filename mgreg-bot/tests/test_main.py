@@ -0,0 +1,16 @@
+from types import SimpleNamespace
+
+import pytest
+
+from bot import webhook_server
+from bot.main import run_webhook
+
+
+async def test_run_webhook_requires_secret(monkeypatch):
+    monkeypatch.setattr(webhook_server, "dispatcher_instance", None)
+    settings = SimpleNamespace(telegram_webhook_secret=None)
+
+    with pytest.raises(RuntimeError, match="TELEGRAM_WEBHOOK_SECRET"):
+        await run_webhook(bot=None, dp=None, server=None, settings=settings)
+
+    assert webhook_server.dispatcher_instance is None
@@ -1,3 +1,4 @@
+import email
 import json
 from datetime import date
 
@@ -6,7 +7,7 @@ import respx
 from httpx import Response
 
 from bot.schemas import ContactData
-from bot.services.planfix import PlanfixClient
+from bot.services.planfix import UPLOAD_CHUNK_SIZE, PlanfixClient, PlanfixClientError, RetryPolicy
 
 
 @pytest.mark.asyncio
@@ -110,3 +111,193 @@ async def test_ensure_contact_updates_contact():
 
     await client.close()
 
+
+
+@pytest.mark.asyncio
+async def test_contact_template_is_cached():
+    client = PlanfixClient(
+        base_url="https://example.planfix/rest/",
+        token="token",
+        template_id=413,
+    )
+
+    async with respx.mock(base_url="https://example.planfix/rest/") as router:
+        templates_route = router.get("contact/templates").respond(
+            200,
+            json={"templates": [{"id": 413, "customFields": []}]},
+        )
+
+        first = await client.get_contact_template()
+        second = await client.get_contact_template()
+
+        assert first is second
+        assert templates_route.call_count == 1
+
+        client.invalidate_template()
+        await client.get_contact_template()
+
+        assert templates_route.call_count == 2
+
+    await client.close()
+
+
+@pytest.mark.asyncio
+async def test_request_retries_server_errors(monkeypatch):
+    delays = []
+
+    async def fake_sleep(delay):
+        delays.append(delay)
+
+    monkeypatch.setattr("bot.services.planfix.asyncio.sleep", fake_sleep)
+
+    client = PlanfixClient(
+        base_url="https://example.planfix/rest/",
+        token="token",
+        template_id=413,
+    )
+
+    async with respx.mock(base_url="https://example.planfix/rest/") as router:
+        route = router.get("contact/5").mock(
+            side_effect=[
+                Response(502, text="bad gateway"),
+                Response(503, text="unavailable"),
+                Response(200, json={"contact": {"id": 5}}),
+            ]
+        )
+
+        contact = await client.get_contact(5)
+
+        assert contact == {"id": 5}
+        assert route.call_count == 3
+        assert len(delays) == 2
+        assert 0 <= delays[0] <= 1
+        assert 0 <= delays[1] <= 2
+
+    await client.close()
+
+
+@pytest.mark.asyncio
+async def test_ensure_contact_update_looks_up_contact_by_phone():
+    client = PlanfixClient(
+        base_url="https://example.planfix/rest/",
+        token="token",
+        template_id=413,
+    )
+
+    contact_data = ContactData(
+        phone="+79260000000",
+        last_name="Иванов",
+        first_name="Иван",
+        patronymic=None,
+        gender="Мужской",
+        birthdate=date(1990, 1, 1),
+        city="Москва",
+    )
+
+    async with respx.mock(base_url="https://example.planfix/rest/") as router:
+        router.get("contact/templates").respond(
+            200,
+            json={"templates": [{"id": 413, "customFields": []}]},
+        )
+        router.post("contact/list").respond(200, json={"contacts": [{"id": 777}]})
+        update_route = router.post("contact/777").respond(200, json={"id": 777})
+
+        response = await client.ensure_contact(contact_data, update_existing=True)
+
+        assert response["id"] == 777
+        assert update_route.called
+
+    await client.close()
+
+
+@pytest.mark.asyncio
+async def test_request_does_not_retry_client_errors():
+    client = PlanfixClient(
+        base_url="https://example.planfix/rest/",
+        token="token",
+        template_id=413,
+    )
+
+    async with respx.mock(base_url="https://example.planfix/rest/") as router:
+        route = router.get("contact/5").respond(400, text="bad request")
+
+        with pytest.raises(PlanfixClientError) as exc_info:
+            await client.get_contact(5)
+
+        assert exc_info.value.status_code == 400
+        assert route.call_count == 1
+
+    await client.close()
+
+
+@pytest.mark.asyncio
+async def test_set_task_executors_skips_empty_list():
+    client = PlanfixClient(
+        base_url="https://example.planfix/rest/",
+        token="token",
+        template_id=413,
+    )
+
+    async with respx.mock(base_url="https://example.planfix/rest/", assert_all_called=False) as router:
+        route = router.post("task/42")
+
+        assert await client.set_task_executors(42, []) == {}
+        assert not route.called
+
+    await client.close()
+
+
+@pytest.mark.asyncio
+async def test_contact_template_client_error_is_not_refetched():
+    client = PlanfixClient(
+        base_url="https://example.planfix/rest/",
+        token="token",
+        template_id=413,
+    )
+
+    async with respx.mock(base_url="https://example.planfix/rest/") as router:
+        templates_route = router.get("contact/templates").respond(401, text="unauthorized")
+
+        with pytest.raises(PlanfixClientError):
+            await client.get_contact_template()
+
+        assert templates_route.call_count == 1
+
+    await client.close()
+
+
+@pytest.mark.asyncio
+async def test_upload_file_to_task_streams_multipart_and_retries(tmp_path):
+    payload = bytes(range(256)) * (UPLOAD_CHUNK_SIZE // 128)
+    path = tmp_path / 'фото "1".jpg'
+    path.write_bytes(payload)
+    client = PlanfixClient(
+        base_url="https://example.planfix/rest/",
+        token="token",
+        template_id=413,
+        retry_policy=RetryPolicy(backoff_max=0),
+    )
+
+    async with respx.mock(base_url="https://example.planfix/rest/") as router:
+        route = router.post("task/7/files").mock(
+            side_effect=[Response(502, text="bad gateway"), Response(200, json={"id": 1})]
+        )
+
+        response = await client.upload_file_to_task(7, str(path), description="Чек")
+
+        assert response == {"id": 1}
+        assert route.call_count == 2
+        # The retry sends the whole body again, not the remainder of a consumed stream
+        for call in route.calls:
+            request = call.request
+            assert int(request.headers["Content-Length"]) == len(request.content)
+            message = email.message_from_bytes(
+                f"Content-Type: {request.headers['Content-Type']}\r\n\r\n".encode() + request.content
+            )
+            description, file_part = message.get_payload()
+            assert description.get_param("name", header="Content-Disposition") == "description"
+            assert description.get_payload(decode=True).decode() == "Чек"
+            assert file_part.get_param("name", header="Content-Disposition") == "file"
+            assert file_part.get_payload(decode=True) == payload
+
+    await client.close()
@@ -0,0 +1,101 @@
+import asyncio
+from types import SimpleNamespace
+
+import pytest
+
+from aiogram.fsm.context import FSMContext
+from aiogram.fsm.storage.base import StorageKey
+from aiogram.fsm.storage.memory import MemoryStorage
+
+from bot.handlers.registration import (
+    GENDER_PREFIX,
+    GENDERS,
+    _find_contacts_by_phone,
+    _with_callback_ack,
+    handle_gender_choice,
+)
+from bot.services.planfix import PlanfixError
+from bot.states import RegistrationStates
+
+
+async def test_gender_choice_replaces_keyboard_with_chosen_value():
+    state = FSMContext(storage=MemoryStorage(), key=StorageKey(bot_id=1, chat_id=1, user_id=1))
+    await state.set_state(RegistrationStates.waiting_for_gender)
+    edits = []
+    answers = []
+
+    async def edit_text(text, reply_markup=None):
+        edits.append((text, reply_markup))
+
+    async def answer(text=None, **kwargs):
+        answers.append(text)
+
+    async def ack(*args, **kwargs):
+        return None
+
+    callback = SimpleNamespace(
+        data=f"{GENDER_PREFIX}1",
+        answer=ack,
+        message=SimpleNamespace(edit_text=edit_text, answer=answer),
+    )
+
+    await handle_gender_choice(callback, state)
+
+    assert (await state.get_data())["gender"] == GENDERS[1]
+    assert await state.get_state() == RegistrationStates.waiting_for_birthdate.state
+    assert len(edits) == 1
+    text, markup = edits[0]
+    assert GENDERS[1] in text
+    assert markup is None
+    assert len(answers) == 1
+
+
+async def test_callback_ack_finishes_when_work_fails():
+    acked = []
+
+    async def ack(*args, **kwargs):
+        await asyncio.sleep(0.01)
+        acked.append(True)
+
+    async def work():
+        raise PlanfixError("boom")
+
+    with pytest.raises(PlanfixError):
+        await _with_callback_ack(SimpleNamespace(answer=ack), work())
+
+    # The failing work must neither cancel the answer nor leave it running
+    assert acked == [True]
+
+
+async def test_callback_ack_failure_does_not_fail_work():
+    async def ack(*args, **kwargs):
+        raise RuntimeError("query is too old")
+
+    async def work():
+        return 42
+
+    assert await _with_callback_ack(SimpleNamespace(answer=ack), work()) == 42
+
+
+async def test_contact_search_failure_cancels_template_fetch():
+    template_fetch = asyncio.Event()
+    cancelled = []
+
+    class FailingSearch:
+        async def list_contacts_by_phone(self, phone):
+            await template_fetch.wait()
+            raise PlanfixError("search failed", status_code=500)
+
+        async def get_contact_template(self):
+            template_fetch.set()
+            try:
+                await asyncio.sleep(10)
+            except asyncio.CancelledError:
+                cancelled.append(True)
+                raise
+
+    with pytest.raises(PlanfixError, match="search failed"):
+        await _find_contacts_by_phone(FailingSearch(), "+79260000000")
+
+    # The template request is cancelled rather than left running behind the handler
+    assert cancelled == [True]
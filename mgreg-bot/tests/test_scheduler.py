@@ -0,0 +1,152 @@
+import subprocess
+import sys
+from datetime import datetime, timezone
+
+import pytest
+
+from bot import scheduler, webhook_server
+from bot.config import get_settings
+from bot.scheduler import (
+    RETRY_TASK_BACKOFF,
+    RETRY_TASK_BACKOFF_MAX,
+    _defer_task_retry,
+    parse_deadline,
+    retry_executor_assignments,
+    scan_expired_deadlines,
+    schedule_deadline_check,
+)
+from tests.conftest import FakePlanfix
+
+
+@pytest.mark.parametrize(
+    "value,expected",
+    [
+        ("2024-03-05", datetime(2024, 3, 5)),
+        ("05-03-2024", datetime(2024, 3, 5)),
+        ("05.03.2024", datetime(2024, 3, 5)),
+        ("5.3.2024", datetime(2024, 3, 5)),
+        ("2024-03-05T10:30:00Z", datetime(2024, 3, 5, 10, 30, tzinfo=timezone.utc)),
+    ],
+)
+def test_parse_deadline(value, expected):
+    assert parse_deadline(value) == expected
+
+
+@pytest.mark.parametrize("value", ["05-03.2024", "завтра", ""])
+def test_parse_deadline_invalid(value):
+    with pytest.raises(ValueError):
+        parse_deadline(value)
+
+
+@pytest.mark.parametrize(
+    "attempts,expected_delay",
+    [
+        (0, RETRY_TASK_BACKOFF),
+        (2, RETRY_TASK_BACKOFF * 4),
+        # Past the cap the shift must not overflow into a negative or zero delay
+        (58, RETRY_TASK_BACKOFF_MAX),
+        (59, RETRY_TASK_BACKOFF_MAX),
+        (70, RETRY_TASK_BACKOFF_MAX),
+    ],
+)
+async def test_defer_task_retry_backoff_is_capped(db, attempts, expected_delay):
+    await db.init()
+    await db.execute(
+        "INSERT INTO tasks (task_id, restaurant_name, deadline, retry_attempts) VALUES (1, 'r', '', ?)",
+        (attempts,),
+    )
+
+    await _defer_task_retry(db, 1)
+
+    row = await db.fetch_one(
+        "SELECT retry_attempts, CAST(strftime('%s', next_retry_at) - strftime('%s', 'now') AS INTEGER) AS delay"
+        " FROM tasks WHERE task_id = 1"
+    )
+    assert row["retry_attempts"] == attempts + 1
+    assert expected_delay - 2 <= row["delay"] <= expected_delay
+
+
+async def test_scan_expired_deadlines_processes_each_deadline_once(db, monkeypatch):
+    await db.init()
+    today = datetime.now(timezone.utc).date().isoformat()
+    for task_id, deadline, status in [
+        (1, "2020-01-01", "waiting_form"),
+        (2, "2099-01-01", "waiting_form"),
+        (3, "2020-01-01", "cancelled_manual"),
+        # The deadline day itself is still open for the check
+        (4, today, "waiting_form"),
+    ]:
+        await db.execute(
+            "INSERT INTO tasks (task_id, restaurant_name, deadline, status) VALUES (?, 'r', ?, ?)",
+            (task_id, deadline, status),
+        )
+    client = FakePlanfix()
+    monkeypatch.setattr(webhook_server, "planfix_client", client)
+    monkeypatch.setattr(webhook_server, "bot_instance", None)
+    monkeypatch.setattr(get_settings(), "status_cancelled_id", 11)
+
+    await scan_expired_deadlines()
+    await scan_expired_deadlines()
+
+    # Only the expired, still active task is cancelled, and only on the first scan
+    assert client.calls == [("update_task", 1), ("add_task_comment", 1)]
+    rows = await db.fetch_all("SELECT task_id, deadline_checked_at IS NOT NULL AS checked FROM tasks ORDER BY task_id")
+    assert [(row["task_id"], row["checked"]) for row in rows] == [(1, 1), (2, 0), (3, 0), (4, 0)]
+
+
+async def test_scan_expired_deadlines_keeps_deadline_rearmed_during_scan(db, monkeypatch):
+    await db.init()
+    await db.execute("INSERT INTO tasks (task_id, restaurant_name, deadline) VALUES (1, 'r', '2020-01-01')")
+    monkeypatch.setattr(webhook_server, "planfix_client", FakePlanfix())
+
+    async def rearm_while_checking(task_id, client):
+        # A webhook moves the deadline while the scan is still working on the task
+        await db.execute("UPDATE tasks SET deadline = '2099-01-01' WHERE task_id = ?", (task_id,))
+        await schedule_deadline_check(task_id, "2099-01-01")
+
+    monkeypatch.setattr(scheduler, "check_task_deadline", rearm_while_checking)
+
+    await scan_expired_deadlines()
+
+    row = await db.fetch_one("SELECT deadline, deadline_checked_at FROM tasks WHERE task_id = 1")
+    assert row["deadline"] == "2099-01-01"
+    assert row["deadline_checked_at"] is None
+
+
+async def test_retry_cycle_writes_task_updates_in_one_transaction(db, monkeypatch, counting_transaction):
+    await db.init()
+    for task_id, guest_id in [(1, 10), (2, 20), (3, 30)]:
+        await db.execute(
+            "INSERT INTO tasks (task_id, nomber, restaurant_name, deadline, assigned_guest_id)"
+            " VALUES (?, ?, 'r', '', ?)",
+            (task_id, str(task_id), guest_id),
+        )
+    # Task 1 needs assigning, task 2 is already assigned in Planfix, task 3 fails to assign
+    client = FakePlanfix(assigned={"2": ["contact:20"]}, failing=("3",))
+    monkeypatch.setattr(webhook_server, "planfix_client", client)
+    monkeypatch.setattr(webhook_server, "bot_instance", None)
+
+    await retry_executor_assignments()
+
+    assert counting_transaction.count == 1
+    executor_calls = [call[1] for call in client.calls if call[0] == "set_task_executors"]
+    assert "1" in executor_calls
+    assert "2" not in executor_calls
+    rows = await db.fetch_all(
+        "SELECT task_id, executor_confirmed_at IS NOT NULL AS confirmed, last_attempt_at IS NOT NULL AS attempted,"
+        " retry_attempts FROM tasks ORDER BY task_id"
+    )
+    assert [tuple(row) for row in rows] == [(1, 1, 0, 0), (2, 1, 0, 0), (3, 0, 1, 1)]
+
+
+def test_importing_scheduler_does_not_read_settings():
+    # The scheduler (and webhook_server it imports) must be importable without an environment
+    code = (
+        "import bot.config\n"
+        "def fail():\n"
+        "    raise RuntimeError('settings read at import')\n"
+        "bot.config.get_settings = fail\n"
+        "import bot.scheduler\n"
+    )
+    result = subprocess.run([sys.executable, "-c", code], capture_output=True, text=True)
+    assert result.returncode == 0, result.stderr
@@ -3,6 +3,8 @@ from datetime import date
 import pytest
 
 from bot.services.validators import (
+    _NAME_CHARS,
+    _NON_DIGITS,
     ValidationException,
     normalize_phone,
     parse_birthdate,
@@ -32,9 +34,17 @@ def test_normalize_phone_invalid(input_value):
 def test_parse_birthdate_success():
     assert parse_birthdate("01.01.2000") == date(2000, 1, 1)
     assert parse_birthdate("2000-01-01") == date(2000, 1, 1)
+    assert parse_birthdate("1.1.2000") == date(2000, 1, 1)
 
 
-@pytest.mark.parametrize("input_value", ["32.01.2000", "2000/01/01", "", None])
+def test_parse_birthdate_age_bounds_use_given_today():
+    today = date(2030, 6, 15)
+    assert parse_birthdate("15.06.2020", today=today) == date(2020, 6, 15)
+    with pytest.raises(ValidationException):
+        parse_birthdate("16.06.2020", today=today)
+
+
+@pytest.mark.parametrize("input_value", ["32.01.2000", "29.02.2001", "2000/01/01", "", None])
 def test_parse_birthdate_invalid(input_value):
     with pytest.raises(ValidationException):
         parse_birthdate(input_value or "")
@@ -42,9 +52,10 @@ def test_parse_birthdate_invalid(input_value):
 
 def test_validate_name_success():
     assert validate_name("Иван", "Имя") == "Иван"
+    assert validate_name(" Анна-Мария ", "Имя") == "Анна-Мария"
 
 
-@pytest.mark.parametrize("input_value", ["", "A", "@#$", None])
+@pytest.mark.parametrize("input_value", ["", "A", "@#$", "Иван!", None])
 def test_validate_name_invalid(input_value):
     with pytest.raises(ValidationException):
         validate_name(input_value or "", "Имя")
@@ -59,3 +70,15 @@ def test_validate_city_invalid(input_value):
     with pytest.raises(ValidationException):
         validate_city(input_value)
 
+
+
+def test_translate_tables_do_not_grow_on_exotic_input():
+    sizes = (len(_NON_DIGITS), len(_NAME_CHARS))
+    exotic = "".join(chr(codepoint) for codepoint in range(0x1F600, 0x1F650))
+
+    with pytest.raises(ValidationException):
+        normalize_phone("+7926" + exotic)
+    with pytest.raises(ValidationException):
+        validate_name("Иван" + exotic, "Имя")
+
+    assert (len(_NON_DIGITS), len(_NAME_CHARS)) == sizes
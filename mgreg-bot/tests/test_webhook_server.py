@@ -0,0 +1,90 @@
+import pytest
+from aiogram import Bot
+from fastapi.testclient import TestClient
+
+from bot import webhook_server
+from bot.config import get_settings
+
+UPDATE_JSON = '{"update_id": 1}'
+
+
+class FakeDispatcher:
+    def __init__(self, error: Exception | None = None) -> None:
+        self.error = error
+        self.updates = []
+
+    async def feed_update(self, bot, update):
+        self.updates.append(update)
+        if self.error:
+            raise self.error
+
+
+@pytest.fixture
+def telegram_webhook(monkeypatch):
+    dispatcher = FakeDispatcher()
+    monkeypatch.setattr(webhook_server, "dispatcher_instance", dispatcher)
+    monkeypatch.setattr(webhook_server, "bot_instance", Bot("42:TEST"))
+    monkeypatch.setattr(get_settings(), "telegram_webhook_secret", "s3cret")
+    return dispatcher
+
+
+def test_telegram_webhook_feeds_update(telegram_webhook):
+    client = TestClient(webhook_server.app)
+
+    response = client.post(
+        "/webhooks/telegram",
+        content=UPDATE_JSON,
+        headers={"X-Telegram-Bot-Api-Secret-Token": "s3cret"},
+    )
+
+    assert response.status_code == 200
+    assert [update.update_id for update in telegram_webhook.updates] == [1]
+
+
+@pytest.mark.parametrize("headers", [{}, {"X-Telegram-Bot-Api-Secret-Token": "wrong"}])
+def test_telegram_webhook_rejects_bad_secret(telegram_webhook, headers):
+    client = TestClient(webhook_server.app)
+
+    response = client.post("/webhooks/telegram", content=UPDATE_JSON, headers=headers)
+
+    assert response.status_code == 401
+    assert telegram_webhook.updates == []
+
+
+def test_telegram_webhook_requires_configured_secret(telegram_webhook, monkeypatch):
+    monkeypatch.setattr(get_settings(), "telegram_webhook_secret", None)
+    client = TestClient(webhook_server.app)
+
+    response = client.post("/webhooks/telegram", content=UPDATE_JSON)
+
+    assert response.status_code == 401
+    assert telegram_webhook.updates == []
+
+
+@pytest.mark.parametrize("body", ["not json", '{"message": {}}'])
+def test_telegram_webhook_rejects_malformed_update(telegram_webhook, body):
+    client = TestClient(webhook_server.app)
+
+    response = client.post(
+        "/webhooks/telegram",
+        content=body,
+        headers={"X-Telegram-Bot-Api-Secret-Token": "s3cret"},
+    )
+
+    assert response.status_code == 400
+    assert telegram_webhook.updates == []
+
+
+def test_telegram_webhook_acknowledges_failed_handler(telegram_webhook):
+    telegram_webhook.error = RuntimeError("handler failed")
+    client = TestClient(webhook_server.app)
+
+    response = client.post(
+        "/webhooks/telegram",
+        content=UPDATE_JSON,
+        headers={"X-Telegram-Bot-Api-Secret-Token": "s3cret"},
+    )
+
+    # An error status would make Telegram redeliver the update and rerun its side effects
+    assert response.status_code == 200
+    assert len(telegram_webhook.updates) == 1